@@ -1,14 +1,23 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, get_args
 
-from click import Command, command
-from utilities.click import CONTEXT_SETTINGS, Path, option
-from utilities.constants import PWD
+from click import Choice, Command, UsageError, command, echo
+from utilities.click import CONTEXT_SETTINGS, Path, Str, flag, option
 from utilities.core import is_pytest, set_up_logging
 
 from actions import __version__
-from actions.clean_dir.lib import clean_dir
+from actions.clean_dir.constants import (
+    CACHE_DIRS,
+    CLEAN_DIR_SUB_CMD,
+    EXCLUDE,
+    INCLUDE,
+    MAX_WORKERS,
+    REMOVE_DIRS,
+    STRATEGY,
+    Strategy,
+)
+from actions.clean_dir.lib import clean_dir, watch_dir
 
 if TYPE_CHECKING:
     from collections.abc import Callable
@@ -16,23 +25,142 @@ if TYPE_CHECKING:
     from utilities.types import PathLike
 
 
-CLEAN_DIR_SUB_CMD = "clean-dir"
-
-
 def make_clean_dir_cmd(
     *, cli: Callable[..., Command] = command, name: str | None = None
 ) -> Command:
     @option(
         "--path",
+        "paths",
         type=Path(exist="existing dir"),
-        default=PWD,
-        help="The directory to clean",
+        multiple=True,
+        help="The directory(s) to clean; defaults to the current directory",
+    )
+    @option(
+        "--manifest",
+        type=Path(exist="existing file"),
+        default=None,
+        help="A file listing the directories to clean, one per line",
+    )
+    @option(
+        "--max-workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="The number of directories to clean concurrently",
+    )
+    @option(
+        "--include",
+        type=Str(),
+        multiple=True,
+        default=INCLUDE,
+        help="Glob(s) of file names to delete",
+    )
+    @option(
+        "--exclude",
+        type=Str(),
+        multiple=True,
+        default=EXCLUDE,
+        help="Glob(s) of names to keep & not descend into",
+    )
+    @option(
+        "--remove-dir",
+        "remove_dirs",
+        type=Str(),
+        multiple=True,
+        default=REMOVE_DIRS,
+        help="Glob(s) of directory names to delete wholesale",
+    )
+    @option(
+        "--cache-dir",
+        "cache_dirs",
+        type=Str(),
+        multiple=True,
+        default=CACHE_DIRS,
+        help="Glob(s) of cache directory names to evict when over budget",
+    )
+    @option(
+        "--max-size",
+        type=int,
+        default=None,
+        help="Evict caches until their total size is at most this many bytes",
+    )
+    @option(
+        "--min-free",
+        type=int,
+        default=None,
+        help="Evict caches until their filesystem has this many bytes free",
+    )
+    @option(
+        "--strategy",
+        type=Choice(get_args(Strategy)),
+        default=STRATEGY,
+        help="Walk the tree, or list ignored paths with 'git' where possible",
+    )
+    @flag("--dry-run", default=False, help="Report what would be deleted")
+    @flag(
+        "--incremental",
+        default=False,
+        help="Only re-list directories whose mtime changed since the last run",
+    )
+    @option(
+        "--json",
+        "json_",
+        is_flag=True,
+        default=False,
+        help="Print the report as JSON, with nothing else on stdout",
+    )
+    @flag(
+        "--watch",
+        default=False,
+        help="Keep cleaning as the directories change, using 'inotify'",
     )
-    def func(*, path: PathLike) -> None:
+    def func(
+        *,
+        paths: tuple[PathLike, ...],
+        manifest: PathLike | None,
+        max_workers: int,
+        include: tuple[str, ...],
+        exclude: tuple[str, ...],
+        remove_dirs: tuple[str, ...],
+        cache_dirs: tuple[str, ...],
+        max_size: int | None,
+        min_free: int | None,
+        strategy: Strategy,
+        dry_run: bool,
+        incremental: bool,
+        json_: bool,
+        watch: bool,
+    ) -> None:
+        if watch and dry_run:
+            msg = "'--watch' cannot be used with '--dry-run'"
+            raise UsageError(msg)
         if is_pytest():
             return
-        set_up_logging(__name__, root=True, log_version=__version__)
-        clean_dir(path=path)
+        if not json_:
+            set_up_logging(__name__, root=True, log_version=__version__)
+        report = clean_dir(
+            *paths,
+            manifest=manifest,
+            max_workers=max_workers,
+            include=include,
+            exclude=exclude,
+            remove_dirs=remove_dirs,
+            dry_run=dry_run,
+            incremental=incremental,
+            cache_dirs=cache_dirs,
+            max_size=max_size,
+            min_free=min_free,
+            strategy=strategy,
+        )
+        if json_:
+            echo(report.to_json())
+        if watch:
+            watch_dir(
+                *paths,
+                manifest=manifest,
+                include=include,
+                exclude=exclude,
+                remove_dirs=remove_dirs,
+            )
 
     return cli(name=name, help="Clean a directory", **CONTEXT_SETTINGS)(func)
 
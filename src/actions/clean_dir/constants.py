@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Literal
+
+from utilities.constants import CPU_COUNT
+
+import actions.constants
+
+CLEAN_DIR_SUB_CMD = "clean-dir"
+MAX_WORKERS = CPU_COUNT
+PATH_CACHE = actions.constants.PATH_CACHE / CLEAN_DIR_SUB_CMD
+
+
+CACHE_DIRS: tuple[str, ...] = (
+    ".hypothesis",
+    ".mypy_cache",
+    ".nox",
+    ".pytest_cache",
+    ".ruff_cache",
+    ".tox",
+    "build",
+    "dist",
+    "htmlcov",
+)
+BUILD_DIRS: tuple[str, ...] = ("build", "dist")
+PROJECT_FILES: tuple[str, ...] = ("pyproject.toml", "setup.cfg", "setup.py")
+EXCLUDE: tuple[str, ...] = (".git", ".venv", "node_modules")
+INCLUDE: tuple[str, ...] = ("*.pyc", "*.pyo")
+REMOVE_DIRS: tuple[str, ...] = ("__pycache__",)
+
+
+Strategy = Literal["walk", "git"]
+STRATEGY: Strategy = "walk"
+
+
+WATCH_DEBOUNCE = 1.0
+WATCH_MAX_DELAY = 10.0
+
+
+__all__ = [
+    "BUILD_DIRS",
+    "CACHE_DIRS",
+    "CLEAN_DIR_SUB_CMD",
+    "EXCLUDE",
+    "INCLUDE",
+    "MAX_WORKERS",
+    "PATH_CACHE",
+    "PROJECT_FILES",
+    "REMOVE_DIRS",
+    "STRATEGY",
+    "WATCH_DEBOUNCE",
+    "WATCH_MAX_DELAY",
+    "Strategy",
+]
@@ -1,52 +1,889 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import suppress
+from ctypes import CDLL, get_errno
+from ctypes.util import find_library
+from dataclasses import asdict, dataclass, field, fields
+from datetime import UTC, datetime
+from errno import ENOENT, ENOTDIR
+from fnmatch import translate
+from functools import cache
+from hashlib import sha256
+from json import dumps, loads
+from os import (
+    O_CLOEXEC,
+    close,
+    fsdecode,
+    fsencode,
+    lstat,
+    read,
+    rmdir,
+    scandir,
+    stat,
+    strerror,
+    unlink,
+)
+from os.path import basename, dirname, join, lexists
 from pathlib import Path
-from shutil import rmtree
-from typing import TYPE_CHECKING
+from re import compile as re_compile
+from select import select
+from shutil import disk_usage, rmtree
+from struct import Struct
+from time import monotonic, perf_counter
+from typing import TYPE_CHECKING, Self
 
-from utilities.constants import PWD
-from utilities.core import to_logger
+from utilities.constants import PWD, SYSTEM
+from utilities.core import to_logger, write_text
+
+from actions.clean_dir.constants import (
+    BUILD_DIRS,
+    CACHE_DIRS,
+    EXCLUDE,
+    INCLUDE,
+    MAX_WORKERS,
+    PATH_CACHE,
+    PROJECT_FILES,
+    REMOVE_DIRS,
+    STRATEGY,
+    WATCH_DEBOUNCE,
+    WATCH_MAX_DELAY,
+)
+from actions.utilities import logged_run
 
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Iterator, Sequence
+    from os import DirEntry
+    from re import Pattern
 
     from utilities.types import PathLike
 
+    from actions.clean_dir.constants import Strategy
+
 
 _LOGGER = to_logger(__name__)
 
 
-def clean_dir(*, path: PathLike = PWD) -> None:
-    """Clean a directory."""
-    _LOGGER.info("Cleaning directory...")
+def clean_dir(
+    *paths: PathLike,
+    manifest: PathLike | None = None,
+    max_workers: int = MAX_WORKERS,
+    include: Sequence[str] = INCLUDE,
+    exclude: Sequence[str] = EXCLUDE,
+    remove_dirs: Sequence[str] = REMOVE_DIRS,
+    dry_run: bool = False,
+    incremental: bool = False,
+    cache_dirs: Sequence[str] = CACHE_DIRS,
+    max_size: int | None = None,
+    min_free: int | None = None,
+    strategy: Strategy = STRATEGY,
+) -> CleanDirReport:
+    """Clean one or more directories.
+
+    Files matching 'include' are deleted, directories matching 'remove_dirs'
+    are deleted wholesale, and entries matching 'exclude' are neither deleted
+    nor descended into. All patterns are globs on the entry name.
+
+    If 'incremental', an index of directory mtimes is kept per root under the
+    cache, and directories unchanged since the last run are not re-listed.
+
+    If 'max_size' (the total bytes of the caches) or 'min_free' (the free bytes
+    on their filesystems) is given, directories matching 'cache_dirs' are then
+    evicted, least-recently used first, until within budget. 'build' & 'dist'
+    only count if 'git' ignores them or, outside 'git', beside a project file.
+
+    If 'strategy' is 'git', roots inside a 'git' work tree are cleaned from a
+    single listing of their ignored paths instead of a walk; other roots are
+    walked. Only ignored paths are considered, so untracked artifacts which are
+    not ignored, and pre-existing empty directories, are left alone.
+    """
+    _LOGGER.info("Cleaning directory%s...", " (dry-run)" if dry_run else "")
+    start = perf_counter()
+    roots = _get_roots(*paths, manifest=manifest)
+    rules = _Rules(
+        include=tuple(include), exclude=tuple(exclude), remove_dirs=tuple(remove_dirs)
+    )
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _clean_root,
+                r,
+                rules=rules,
+                dry_run=dry_run,
+                incremental=incremental,
+                strategy=strategy,
+            ): r
+            for r in roots
+        }
+        by_root = {str(futures[f]): f.result() for f in as_completed(futures)}
+    if (max_size is not None) or (min_free is not None):
+        evicted = _evict_caches(
+            roots,
+            rules=rules,
+            cache_dirs=cache_dirs,
+            max_size=max_size,
+            min_free=min_free,
+            dry_run=dry_run,
+        )
+        by_root = {k: v + evicted[k] for k, v in by_root.items()}
+    report = CleanDirReport(
+        roots={str(r): by_root[str(r)] for r in roots},
+        dry_run=dry_run,
+        duration=perf_counter() - start,
+    )
+    _LOGGER.info(
+        "Finished cleaning %d directory(s)%s; %s",
+        len(roots),
+        " (dry-run)" if dry_run else "",
+        report.total.describe(),
+    )
+    return report
+
+
+def _get_roots(*paths: PathLike, manifest: PathLike | None = None) -> list[Path]:
+    """Get the distinct roots, dropping any nested inside another."""
+    all_paths = list(map(Path, paths))
+    if manifest is not None:
+        all_paths.extend(_read_manifest(manifest))
+    if len(all_paths) == 0:
+        all_paths.append(PWD)
+    for path in all_paths:
+        if not path.is_dir():
+            msg = f"{str(path)!r} is a not a directory"
+            raise NotADirectoryError(msg)
+    roots: list[Path] = []
+    for path in sorted({p.resolve() for p in all_paths}):
+        if not any(path.is_relative_to(r) for r in roots):
+            roots.append(path)
+    return roots
+
+
+def _read_manifest(path: PathLike, /) -> Iterator[Path]:
+    """Read a manifest of directories; one per line, relative to the manifest."""
     path = Path(path)
-    if not path.is_dir():
-        msg = f"{str(path)!r} is a not a directory"
-        raise NotADirectoryError(msg)
-    while True:
-        files = list(_yield_files(path=path))
-        if len(files) >= 1:
-            for f in files:
-                f.unlink(missing_ok=True)
-        dirs = list(_yield_dirs(path=path))
-        if len(dirs) >= 1:
-            for d in dirs:
-                rmtree(d, ignore_errors=True)
+    for line in path.read_text().splitlines():
+        if (stripped := line.strip()) and not stripped.startswith("#"):
+            yield path.parent / stripped
+
+
+def _clean_root(
+    path: Path,
+    /,
+    *,
+    rules: _Rules,
+    dry_run: bool = False,
+    incremental: bool = False,
+    strategy: Strategy = STRATEGY,
+) -> CleanDirStats:
+    _LOGGER.info("Cleaning %r...", str(path))
+    if strategy == "git" and not _is_git_work_tree(path):
+        _LOGGER.info("%r is not in a 'git' work tree; walking instead", str(path))
+        strategy = "walk"
+    if strategy == "git":
+        stats = _clean_git(path, rules=rules, dry_run=dry_run)
+    elif incremental:
+        index_path = _get_index_path(path, rules=rules)
+        index = _Index(old=_read_index(index_path))
+        stats = _clean(path, rules=rules, dry_run=dry_run, index=index)
+        if not dry_run:
+            _write_index(index_path, index.new)
+    else:
+        stats = _clean(path, rules=rules, dry_run=dry_run)
+    _LOGGER.info("Finished cleaning %r; %s", str(path), stats.describe())
+    return stats
+
+
+def _clean_git(root: Path, /, *, rules: _Rules, dry_run: bool = False) -> CleanDirStats:
+    """Clean the ignored files & directories listed by 'git', in one call.
+
+    Ignored directories which are neither excluded nor removed wholesale are
+    walked as usual. Directories left empty by a removal are collapsed.
+    """
+    start = perf_counter()
+    stats = CleanDirStats()
+    output = logged_run(
+        "git",
+        "-C",
+        str(root),
+        "ls-files",
+        "--others",
+        "--ignored",
+        "--exclude-standard",
+        "--directory",
+        "-z",
+        return_=True,
+    )
+    parents: set[str] = set()
+    # 'git' may list an ignored directory's contents after the directory itself
+    covered: str | None = None
+    for line in output.split("\0"):
+        if (len(line) == 0) or ((covered is not None) and line.startswith(covered)):
+            continue
+        stats.scanned += 1
+        parts = line.rstrip("/").split("/")
+        if any(map(rules.is_excluded, parts)):
+            continue
+        path = join(root, *parts)  # noqa: PTH118
+        if line.endswith("/"):
+            covered = line
+            if rules.is_removed_dir(parts[-1]):
+                removed = _try_rmtree(path, stats=stats, dry_run=dry_run)
+            else:
+                stats += _clean(path, rules=rules, dry_run=dry_run)
+                removed = (not dry_run) and _try_rmdir(path, stats=stats)
+                stats.dirs += int(removed)
+        elif rules.is_included(parts[-1]):
+            removed = _try_unlink(path, stats=stats, dry_run=dry_run)
         else:
-            break
-    _LOGGER.info("Finished cleaning directory")
+            removed = False
+        if removed:
+            parents.add(dirname(path))  # noqa: PTH120
+    if not dry_run:
+        for path in sorted(parents, key=len, reverse=True):
+            _collapse(path, roots={str(root)}, stats=stats)
+    stats.walk = perf_counter() - start - stats.remove
+    return stats
 
 
-def _yield_dirs(*, path: PathLike = PWD) -> Iterator[Path]:
-    for p in Path(path).rglob("**/*"):
-        if p.is_dir() and (len(list(p.iterdir())) == 0):
-            yield p
+def _is_git_work_tree(path: Path, /) -> bool:
+    return any((p / ".git").exists() for p in [path, *path.parents])
 
 
-def _yield_files(*, path: PathLike = PWD) -> Iterator[Path]:
-    path = Path(path)
-    yield from path.rglob("**/*.pyc")
-    yield from path.rglob("**/*.pyo")
+def _collapse(path: str, /, *, roots: set[str], stats: CleanDirStats) -> None:
+    """Remove a directory & its ancestors while they are empty."""
+    current = path
+    while (current not in roots) and _try_rmdir(current, stats=stats):
+        stats.dirs += 1
+        current = dirname(current)  # noqa: PTH120
+
+
+def _clean(
+    path: PathLike,
+    /,
+    *,
+    rules: _Rules,
+    dry_run: bool = False,
+    index: _Index | None = None,
+) -> CleanDirStats:
+    """Delete matching files & collapse empty directories in one bottom-up pass.
+
+    The walk keeps one open 'scandir' iterator per level, so memory is bounded
+    by the depth of the tree rather than its size. The root is never removed.
+
+    Given an index, directories whose mtime is unchanged since the last run are
+    not listed; the walk only descends into their recorded subdirectories.
+    """
+    start = perf_counter()
+    stats = CleanDirStats()
+    stack: list[_Frame] = [_open_frame(str(path), index=index)]
+    while len(stack) >= 1:
+        frame = stack[-1]
+        try:
+            entry = next(frame.entries)
+        except StopIteration:
+            _ = stack.pop()
+            if frame.cached:
+                stats.cached += 1
+            if (
+                (len(stack) >= 1)
+                and frame.empty
+                and _try_rmdir(frame.path, stats=stats, dry_run=dry_run)
+            ):
+                stats.dirs += 1
+                stack[-1].mutated = True
+                continue
+            if index is not None:
+                index.record(frame)
+            if len(stack) >= 1:
+                stack[-1].subdirs.append(basename(frame.path))  # noqa: PTH119
+            continue
+        if not isinstance(entry, _CachedDir):
+            stats.scanned += 1
+        if rules.is_excluded(entry.name):
+            frame.kept = True
+        elif entry.is_dir(follow_symlinks=False):
+            if rules.is_removed_dir(entry.name):
+                if _try_rmtree(entry.path, stats=stats, dry_run=dry_run):
+                    frame.mutated = True
+                else:
+                    frame.kept = True
+                continue
+            try:
+                stack.append(_open_frame(entry.path, index=index))
+            except OSError:
+                frame.kept = True
+        elif rules.is_included(entry.name):
+            if _try_unlink(entry.path, stats=stats, dry_run=dry_run):
+                frame.mutated = True
+        else:
+            frame.kept = True
+    stats.walk = perf_counter() - start - stats.remove
+    return stats
+
+
+def _try_rmdir(path: str, /, *, stats: CleanDirStats, dry_run: bool = False) -> bool:
+    if dry_run:
+        return True
+    start = perf_counter()
+    try:
+        rmdir(path)  # noqa: PTH106
+    except OSError:
+        return False
+    finally:
+        stats.remove += perf_counter() - start
+    return True
+
+
+def _try_rmtree(
+    path: str,
+    /,
+    *,
+    stats: CleanDirStats,
+    dry_run: bool = False,
+    measured: CleanDirStats | None = None,
+) -> bool:
+    if measured is None:
+        measured, _ = _measure_tree(path)
+    if not dry_run:
+        start = perf_counter()
+        rmtree(path, ignore_errors=True)
+        stats.remove += perf_counter() - start
+        if lexists(path):
+            return False
+    stats.files += measured.files
+    stats.dirs += measured.dirs
+    stats.size += measured.size
+    stats.scanned += measured.scanned
+    return True
+
+
+def _try_unlink(path: str, /, *, stats: CleanDirStats, dry_run: bool = False) -> bool:
+    try:
+        size = lstat(path).st_size
+    except FileNotFoundError:
+        return False
+    if not dry_run:
+        start = perf_counter()
+        try:
+            unlink(path)  # noqa: PTH108
+        except FileNotFoundError:
+            return False
+        finally:
+            stats.remove += perf_counter() - start
+    stats.files += 1
+    stats.size += size
+    return True
+
+
+def _measure_tree(path: str, /) -> tuple[CleanDirStats, float]:
+    """Count the files, directories & bytes of a tree, including its root.
+
+    Also return when it was last used; that is, the latest modification time of
+    any entry, or access time of any file. Directory access times are ignored,
+    since listing a directory (as here) updates them.
+    """
+    stats = CleanDirStats(dirs=1)
+    try:
+        last_used = stat(path, follow_symlinks=False).st_mtime  # noqa: PTH116
+    except OSError:
+        last_used = 0.0
+    stack: list[str] = [path]
+    while len(stack) >= 1:
+        try:
+            entries = scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                stats.scanned += 1
+                try:
+                    result = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    last_used = max(last_used, result.st_mtime)
+                    stats.dirs += 1
+                    stack.append(entry.path)
+                else:
+                    last_used = max(last_used, result.st_atime, result.st_mtime)
+                    stats.files += 1
+                    stats.size += result.st_size
+    return stats, last_used
+
+
+##
+
+
+def _evict_caches(
+    roots: Sequence[Path],
+    /,
+    *,
+    rules: _Rules,
+    cache_dirs: Sequence[str] = CACHE_DIRS,
+    max_size: int | None = None,
+    min_free: int | None = None,
+    dry_run: bool = False,
+) -> dict[str, CleanDirStats]:
+    """Evict cache directories, least-recently used first, until under budget.
+
+    'max_size' caps the total size of the caches under the roots; 'min_free' is
+    the free space to keep on each filesystem holding a cache.
+    """
+    by_root = {str(r): CleanDirStats() for r in roots}
+    caches: list[_Cache] = []
+    for root in roots:
+        start = perf_counter()
+        caches.extend(_find_caches(root, rules=rules, cache_dirs=cache_dirs))
+        by_root[str(root)].evict += perf_counter() - start
+    total = sum(c.stats.size for c in caches)
+    free: dict[int, int] = {}
+    for item in sorted(caches, key=lambda c: c.last_used):
+        if item.dev not in free:
+            free[item.dev] = disk_usage(item.path).free
+        over_size = (max_size is not None) and (total > max_size)
+        under_free = (min_free is not None) and (free[item.dev] < min_free)
+        if not (over_size or under_free):
+            continue
+        _LOGGER.info(
+            "Evicting %r (size = %d, last used = %s)...",
+            item.path,
+            item.stats.size,
+            datetime.fromtimestamp(item.last_used, tz=UTC).isoformat(
+                timespec="seconds"
+            ),
+        )
+        stats = by_root[item.root]
+        start = perf_counter()
+        removed = _try_rmtree(
+            item.path, stats=stats, dry_run=dry_run, measured=item.stats
+        )
+        stats.evict += perf_counter() - start
+        if removed:
+            stats.evicted += 1
+            total -= item.stats.size
+            free[item.dev] += item.stats.size
+    return by_root
+
+
+def _find_caches(
+    root: Path, /, *, rules: _Rules, cache_dirs: Sequence[str] = CACHE_DIRS
+) -> Iterator[_Cache]:
+    cache_rules = _Rules(
+        include=(), exclude=rules.exclude, remove_dirs=tuple(cache_dirs)
+    )
+    stack: list[str] = [str(root)]
+    while len(stack) >= 1:
+        try:
+            entries = scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if cache_rules.is_excluded(entry.name) or not entry.is_dir(
+                    follow_symlinks=False
+                ):
+                    continue
+                if cache_rules.is_removed_dir(entry.name) and (
+                    (entry.name not in BUILD_DIRS) or _is_build_output(entry.path)
+                ):
+                    stats, last_used = _measure_tree(entry.path)
+                    yield _Cache(
+                        root=str(root),
+                        path=entry.path,
+                        dev=entry.stat(follow_symlinks=False).st_dev,
+                        stats=stats,
+                        last_used=last_used,
+                    )
+                else:
+                    stack.append(entry.path)
+
+
+def _is_build_output(path: str, /) -> bool:
+    """Check if a 'build' or 'dist' directory is build output, rather than source.
+
+    In a 'git' work tree it must be ignored (so it tracks no files); otherwise it
+    must sit beside a project file.
+    """
+    parent = Path(path).parent
+    if _is_git_work_tree(parent):
+        output = logged_run(
+            "git",
+            "-C",
+            str(parent),
+            "check-ignore",
+            Path(path).name,
+            suppress=True,
+            return_=True,
+        )
+        return len(output) >= 1
+    return any((parent / f).is_file() for f in PROJECT_FILES)
+
+
+@dataclass(kw_only=True, slots=True)
+class _Cache:
+    root: str
+    path: str
+    dev: int
+    stats: CleanDirStats
+    last_used: float
+
+
+##
+
+
+def watch_dir(
+    *paths: PathLike,
+    manifest: PathLike | None = None,
+    include: Sequence[str] = INCLUDE,
+    exclude: Sequence[str] = EXCLUDE,
+    remove_dirs: Sequence[str] = REMOVE_DIRS,
+    debounce: float = WATCH_DEBOUNCE,
+    max_delay: float = WATCH_MAX_DELAY,
+    duration: float | None = None,
+) -> None:
+    """Keep one or more directories clean as they change, using 'inotify'.
+
+    Events are batched until the tree has been quiet for 'debounce' seconds, or
+    the oldest pending event is 'max_delay' seconds old. Only the directories
+    touched by the batch are then cleaned, and only their direct entries are
+    examined. Directories emptied by a deletion are collapsed upwards.
+    """
+    if SYSTEM != "linux":
+        msg = f"System must be 'linux'; got {SYSTEM!r}"
+        raise TypeError(msg)
+    _LOGGER.info("Watching directory...")
+    roots = _get_roots(*paths, manifest=manifest)
+    rules = _Rules(
+        include=tuple(include), exclude=tuple(exclude), remove_dirs=tuple(remove_dirs)
+    )
+    deadline = None if duration is None else (monotonic() + duration)
+    with _Watcher(roots=roots, rules=rules) as watcher:
+        while (deadline is None) or (monotonic() < deadline):
+            due = watcher.due(debounce=debounce, max_delay=max_delay)
+            wake = [t for t in [due, deadline] if t is not None]
+            timeout = None if len(wake) == 0 else max(min(wake) - monotonic(), 0.0)
+            watcher.wait(timeout=timeout)
+            if (due := watcher.due(debounce=debounce, max_delay=max_delay)) and (
+                monotonic() >= due
+            ):
+                watcher.process()
+        watcher.process()
+    _LOGGER.info("Finished watching directory")
+
+
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_DONT_FOLLOW = 0x02000000
+_IN_ISDIR = 0x40000000
+_IN_MASK = (
+    _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_ONLYDIR
+    | _IN_DONT_FOLLOW
+)
+_IN_EVENT = Struct("iIII")
+
+
+@dataclass(kw_only=True, slots=True)
+class _Watcher:
+    """A set of 'inotify' watches over some trees, and their pending changes."""
+
+    roots: list[Path]
+    rules: _Rules
+    fd: int = -1
+    watches: dict[int, str] = field(default_factory=dict)
+    dirty: set[str] = field(default_factory=set)
+    emptied: set[str] = field(default_factory=set)
+    first_event: float = 0.0
+    last_event: float = 0.0
+
+    def __enter__(self) -> Self:
+        self.fd = _get_libc().inotify_init1(O_CLOEXEC)
+        if self.fd == -1:
+            raise _get_os_error()
+        for root in self.roots:
+            self.add_tree(str(root))
+        self.dirty.clear()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        close(self.fd)
+
+    def add_tree(self, path: str, /) -> None:
+        """Watch a tree, marking its directories as dirty."""
+        stack: list[str] = [path]
+        while len(stack) >= 1:
+            current = stack.pop()
+            wd = _get_libc().inotify_add_watch(self.fd, fsencode(current), _IN_MASK)
+            if wd == -1:
+                error = _get_os_error()
+                if error.errno in {ENOENT, ENOTDIR}:
+                    continue
+                raise error
+            self.watches[wd] = current
+            self.dirty.add(current)
+            with suppress(OSError), scandir(current) as entries:
+                stack.extend(
+                    entry.path
+                    for entry in entries
+                    if entry.is_dir(follow_symlinks=False)
+                    and not (
+                        self.rules.is_excluded(entry.name)
+                        or self.rules.is_removed_dir(entry.name)
+                    )
+                )
+
+    def due(self, *, debounce: float, max_delay: float) -> float | None:
+        """The time at which the pending changes should be processed."""
+        if len(self.dirty) == 0:
+            return None
+        return min(self.last_event + debounce, self.first_event + max_delay)
+
+    def wait(self, *, timeout: float | None = None) -> None:
+        """Wait for & record events."""
+        ready, _, _ = select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return
+        data = read(self.fd, 64 * 1024)
+        now = monotonic()
+        if len(self.dirty) == 0:
+            self.first_event = now
+        self.last_event = now
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _IN_EVENT.unpack_from(data, offset)
+            offset += _IN_EVENT.size
+            name = fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            self._record(wd, mask, name)
+
+    def _record(self, wd: int, mask: int, name: str, /) -> None:
+        if mask & _IN_Q_OVERFLOW:
+            _LOGGER.warning("Event queue overflowed; re-watching all roots")
+            for root in self.roots:
+                self.add_tree(str(root))
+            return
+        if mask & _IN_IGNORED:
+            _ = self.watches.pop(wd, None)
+            return
+        try:
+            parent = self.watches[wd]
+        except KeyError:
+            return
+        if self.rules.is_excluded(name):
+            return
+        self.dirty.add(parent)
+        if mask & (_IN_DELETE | _IN_MOVED_FROM):
+            self.emptied.add(parent)
+        if (mask & _IN_ISDIR) and (mask & (_IN_CREATE | _IN_MOVED_TO)):
+            path = join(parent, name)  # noqa: PTH118
+            if not self.rules.is_removed_dir(name):
+                self.add_tree(path)
+
+    def process(self) -> None:
+        """Clean the directly affected entries of the dirty directories."""
+        if len(self.dirty) == 0:
+            return
+        stats = CleanDirStats()
+        for path in sorted(self.dirty, key=len, reverse=True):
+            if _clean_entries(path, rules=self.rules, stats=stats):
+                self.emptied.add(path)
+        roots = set(map(str, self.roots))
+        for path in sorted(self.emptied, key=len, reverse=True):
+            _collapse(path, roots=roots, stats=stats)
+        _LOGGER.info(
+            "Cleaned %d changed directory(s); %s", len(self.dirty), stats.describe()
+        )
+        self.dirty.clear()
+        self.emptied.clear()
+
+
+def _clean_entries(path: str, /, *, rules: _Rules, stats: CleanDirStats) -> bool:
+    """Clean the direct entries of a directory, returning if any were removed."""
+    removed = False
+    try:
+        entries = scandir(path)
+    except OSError:
+        return False
+    with entries:
+        for entry in entries:
+            stats.scanned += 1
+            if rules.is_excluded(entry.name):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if rules.is_removed_dir(entry.name):
+                    removed |= _try_rmtree(entry.path, stats=stats)
+            elif rules.is_included(entry.name):
+                removed |= _try_unlink(entry.path, stats=stats)
+    return removed
+
+
+@cache
+def _get_libc() -> CDLL:
+    return CDLL(find_library("c") or "libc.so.6", use_errno=True)
+
+
+def _get_os_error() -> OSError:
+    errno = get_errno()
+    return OSError(errno, strerror(errno))
+
+
+##
+
+
+@dataclass(kw_only=True, slots=True)
+class CleanDirStats:
+    """Counts for a clean; timings are in seconds & excluded from equality."""
+
+    files: int = 0
+    dirs: int = 0
+    size: int = 0
+    scanned: int = 0
+    cached: int = 0
+    evicted: int = 0
+    walk: float = field(default=0.0, compare=False)
+    remove: float = field(default=0.0, compare=False)
+    evict: float = field(default=0.0, compare=False)
+
+    def __add__(self, other: Self, /) -> Self:
+        return type(self)(**{
+            f.name: getattr(self, f.name) + getattr(other, f.name) for f in fields(self)
+        })
+
+    def describe(self) -> str:
+        return f"files = {self.files}, dirs = {self.dirs}, size = {self.size}, scanned = {self.scanned}, cached = {self.cached}, evicted = {self.evicted}, walk = {self.walk:.3f}s, remove = {self.remove:.3f}s, evict = {self.evict:.3f}s"
+
+
+@dataclass(kw_only=True, slots=True)
+class CleanDirReport:
+    roots: dict[str, CleanDirStats] = field(default_factory=dict)
+    dry_run: bool = False
+    duration: float = field(default=0.0, compare=False)
+
+    @property
+    def total(self) -> CleanDirStats:
+        return sum(self.roots.values(), start=CleanDirStats())
+
+    def to_json(self) -> str:
+        return dumps({
+            "roots": {k: asdict(v) for k, v in self.roots.items()},
+            "total": asdict(self.total),
+            "dry_run": self.dry_run,
+            "duration": self.duration,
+        })
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class _Rules:
+    include: tuple[str, ...] = INCLUDE
+    exclude: tuple[str, ...] = EXCLUDE
+    remove_dirs: tuple[str, ...] = REMOVE_DIRS
+
+    def is_excluded(self, name: str, /) -> bool:
+        return _compile_globs(self.exclude).match(name) is not None
+
+    def is_included(self, name: str, /) -> bool:
+        return _compile_globs(self.include).match(name) is not None
+
+    def is_removed_dir(self, name: str, /) -> bool:
+        return _compile_globs(self.remove_dirs).match(name) is not None
+
+
+@cache
+def _compile_globs(globs: tuple[str, ...], /) -> Pattern[str]:
+    if len(globs) == 0:
+        return re_compile(r"(?!)")
+    return re_compile("|".join(map(translate, globs)))
+
+
+@dataclass(kw_only=True, slots=True)
+class _Frame:
+    path: str
+    entries: Iterator[DirEntry[str] | _CachedDir]
+    mtime: int = 0
+    cached: bool = False
+    kept: bool = False
+    mutated: bool = False
+    subdirs: list[str] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not self.kept and (len(self.subdirs) == 0)
+
+
+def _open_frame(path: str, /, *, index: _Index | None = None) -> _Frame:
+    if index is None:
+        return _Frame(path=path, entries=scandir(path))
+    mtime = stat(path, follow_symlinks=False).st_mtime_ns  # noqa: PTH116
+    match index.old.get(path):
+        case [int() as old_mtime, bool() as kept, [*subdirs]] if old_mtime == mtime:
+            entries = [_CachedDir(name=n, path=join(path, n)) for n in subdirs]  # noqa: PTH118
+            return _Frame(
+                path=path, entries=iter(entries), mtime=mtime, cached=True, kept=kept
+            )
+        case _:
+            return _Frame(path=path, entries=scandir(path), mtime=mtime)
+
+
+@dataclass(order=True, unsafe_hash=True, kw_only=True, slots=True)
+class _CachedDir:
+    """A subdirectory recorded in the index, standing in for a 'DirEntry'."""
+
+    name: str
+    path: str
+
+    def is_dir(self, *, follow_symlinks: bool = True) -> bool:
+        _ = follow_symlinks
+        return True
+
+
+##
+
+
+_IndexEntry = tuple[int, bool, list[str]]
+_MUTATED = -1
+
+
+@dataclass(kw_only=True, slots=True)
+class _Index:
+    """The directory mtimes of the previous & current runs."""
+
+    old: dict[str, _IndexEntry] = field(default_factory=dict)
+    new: dict[str, _IndexEntry] = field(default_factory=dict)
+
+    def record(self, frame: _Frame, /) -> None:
+        """Record a directory; mutated ones are re-listed on the next run.
+
+        Re-statting a mutated directory would also cover anything created in it
+        since it was listed, which the recorded subdirectories would then miss.
+        """
+        mtime = _MUTATED if frame.mutated else frame.mtime
+        self.new[frame.path] = (mtime, frame.kept, frame.subdirs)
+
+
+def _get_index_path(root: Path, /, *, rules: _Rules) -> Path:
+    key = dumps([str(root), rules.include, rules.exclude, rules.remove_dirs])
+    return PATH_CACHE / f"{sha256(key.encode()).hexdigest()[:16]}.json"
+
+
+def _read_index(path: Path, /) -> dict[str, _IndexEntry]:
+    try:
+        data = loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_index(path: Path, index: dict[str, _IndexEntry], /) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_text(path, dumps(index), overwrite=True)
 
 
-__all__ = ["clean_dir"]
+__all__ = ["CleanDirReport", "CleanDirStats", "clean_dir", "watch_dir"]
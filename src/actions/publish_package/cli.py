@@ -2,20 +2,22 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-from click import Command, command
-from utilities.click import CONTEXT_SETTINGS, SecretStr, Str, option
+from click import Command, UsageError, command
+from utilities.click import CONTEXT_SETTINGS, Path, SecretStr, Str, flag, option
 from utilities.core import is_pytest, set_up_logging
 
 from actions import __version__
-from actions.publish_package.lib import publish_package
+from actions.publish_package.constants import (
+    MAX_CACHE_SIZE,
+    MAX_WORKERS,
+    PUBLISH_PACKAGE_SUB_CMD,
+)
+from actions.publish_package.lib import load_targets, publish_package
 
 if TYPE_CHECKING:
     from collections.abc import Callable
 
-    from utilities.types import SecretLike
-
-
-PUBLISH_PACKAGE_SUB_CMD = "publish-package"
+    from utilities.types import PathLike, SecretLike
 
 
 def make_publish_package_cmd(
@@ -40,6 +42,41 @@ def make_publish_package_cmd(
         default=False,
         help="Whether to load TLS certificates from the platform's native certificate store",
     )
+    @flag("--no-cache", default=False, help="Always build, bypassing the wheel cache")
+    @option(
+        "--max-cache-size",
+        type=int,
+        default=MAX_CACHE_SIZE,
+        help="Maximum size of the wheel cache, in bytes",
+    )
+    @flag(
+        "--workspace",
+        default=False,
+        help="Publish each member of the 'uv' workspace, building them concurrently",
+    )
+    @option(
+        "--max-workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="The number of packages to build & publish concurrently",
+    )
+    @option(
+        "--check-url",
+        type=Str(),
+        default=None,
+        help="The simple API of the index to check for existing versions",
+    )
+    @flag(
+        "--no-check",
+        default=False,
+        help="Build & publish without checking the index for existing versions",
+    )
+    @option(
+        "--targets",
+        type=Path(exist="existing file"),
+        default=None,
+        help="A YAML file of targets to publish to concurrently, instead of the above",
+    )
     def func(
         *,
         username: str | None = None,
@@ -47,16 +84,39 @@ def make_publish_package_cmd(
         publish_url: str | None = None,
         trusted_publishing: bool = False,
         native_tls: bool = False,
+        no_cache: bool = False,
+        max_cache_size: int = MAX_CACHE_SIZE,
+        workspace: bool = False,
+        max_workers: int = MAX_WORKERS,
+        check_url: str | None = None,
+        no_check: bool = False,
+        targets: PathLike | None = None,
     ) -> None:
+        if (targets is not None) and (
+            (username is not None)
+            or (password is not None)
+            or (publish_url is not None)
+            or trusted_publishing
+            or (check_url is not None)
+        ):
+            msg = "'--targets' cannot be used with '--username', '--password', '--publish-url', '--trusted-publishing' or '--check-url'"
+            raise UsageError(msg)
         if is_pytest():
             return
         set_up_logging(__name__, root=True, log_version=__version__)
-        publish_package(
+        _ = publish_package(
             username=username,
             password=password,
             publish_url=publish_url,
             trusted_publishing=trusted_publishing,
             native_tls=native_tls,
+            cache=not no_cache,
+            max_cache_size=max_cache_size,
+            workspace=workspace,
+            max_workers=max_workers,
+            check_url=check_url,
+            check=not no_check,
+            targets=None if targets is None else load_targets(targets),
         )
 
     return cli(name=name, help="Build and publish the package", **CONTEXT_SETTINGS)(
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from utilities.constants import CPU_COUNT
+
+import actions.constants
+
+PUBLISH_PACKAGE_SUB_CMD = "publish-package"
+PATH_CACHE = actions.constants.PATH_CACHE / PUBLISH_PACKAGE_SUB_CMD
+
+
+MAX_CACHE_SIZE = 1024**3
+MAX_WORKERS = CPU_COUNT
+
+
+PYPI_SIMPLE_URL = "https://pypi.org/simple/"
+CHECK_URLS: dict[str, str] = {
+    "https://upload.pypi.org/legacy/": PYPI_SIMPLE_URL,
+    "https://test.pypi.org/legacy/": "https://test.pypi.org/simple/",
+}
+CHECK_TIMEOUT = 10.0
+
+
+__all__ = [
+    "CHECK_TIMEOUT",
+    "CHECK_URLS",
+    "MAX_CACHE_SIZE",
+    "MAX_WORKERS",
+    "PATH_CACHE",
+    "PUBLISH_PACKAGE_SUB_CMD",
+    "PYPI_SIMPLE_URL",
+]
@@ -1,44 +1,526 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import suppress
+from dataclasses import dataclass, field
+from hashlib import sha256
+from json import loads as json_loads
+from os import environ, utime
+from pathlib import Path
+from re import IGNORECASE, VERBOSE, sub
+from re import compile as re_compile
+from shutil import copytree, rmtree
+from tempfile import mkdtemp
+from time import perf_counter
+from tomllib import TOMLDecodeError, loads
+from typing import TYPE_CHECKING, Any
+from urllib.parse import unquote, urlparse
 
+from pydantic import SecretStr
+from requests import RequestException, get
+from utilities.constants import PWD
 from utilities.core import TemporaryDirectory, to_logger
+from utilities.pydantic import extract_secret
 
+from actions.constants import YAML_INSTANCE
+from actions.publish_package.constants import (
+    CHECK_TIMEOUT,
+    CHECK_URLS,
+    MAX_CACHE_SIZE,
+    MAX_WORKERS,
+    PATH_CACHE,
+    PYPI_SIMPLE_URL,
+)
 from actions.utilities import logged_run
 
 if TYPE_CHECKING:
-    from utilities.types import SecretLike
+    from collections.abc import Collection, Sequence
+
+    from utilities.types import PathLike, SecretLike
 
 
 _LOGGER = to_logger(__name__)
+_HREF = re_compile(r"""href\s*=\s*["']([^"']+)["']""")
+_VERSION = re_compile(
+    r"""
+    ^\s*v?
+    (?:(?P<epoch>\d+)!)?
+    (?P<release>\d+(?:\.\d+)*)
+    (?:[-_.]?(?P<pre_l>alpha|a|beta|b|preview|pre|c|rc)[-_.]?(?P<pre_n>\d+)?)?
+    (?:-(?P<post_n1>\d+)|[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>\d+)?)?
+    (?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>\d+)?)?
+    (?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?
+    \s*$
+    """,
+    flags=VERBOSE | IGNORECASE,
+)
+_PRE_LABELS = {"alpha": "a", "beta": "b", "c": "rc", "pre": "rc", "preview": "rc"}
 
 
 def publish_package(
     *,
+    root: Path = PWD,
     username: str | None = None,
     password: SecretLike | None = None,
     publish_url: str | None = None,
     trusted_publishing: bool = False,
     native_tls: bool = False,
-) -> None:
+    cache: bool = True,
+    max_cache_size: int = MAX_CACHE_SIZE,
+    workspace: bool = False,
+    max_workers: int = MAX_WORKERS,
+    check_url: str | None = None,
+    check: bool = True,
+    targets: Sequence[PublishTarget] | None = None,
+) -> list[PublishResult]:
+    """Build & publish a package, or each member of a workspace.
+
+    If 'cache' is set, each wheel is cached under a hash of the tracked sources,
+    so an identical tree is only built once. The cache is trimmed to
+    'max_cache_size' once every upload has finished.
+
+    If 'workspace' is set, the members are built concurrently, with each
+    published as soon as its wheel is ready.
+
+    If 'check' is set, packages whose version is already on the index (at
+    'check_url', or else derived from 'publish_url') are skipped before building.
+
+    If 'targets' are given, they replace the single target described by the
+    other arguments; each package is built once & uploaded to them concurrently.
+    """
+    if (targets is not None) and (
+        (username is not None)
+        or (password is not None)
+        or (publish_url is not None)
+        or trusted_publishing
+        or (check_url is not None)
+    ):
+        msg = "'targets' cannot be combined with 'username', 'password', 'publish_url', 'trusted_publishing' or 'check_url'"
+        raise ValueError(msg)
     _LOGGER.info("Publishing package...")
-    build_head: list[str] = ["uv", "build", "--out-dir"]
-    build_tail: list[str] = ["--wheel", "--clear"]
-    publish: list[SecretLike] = ["uv", "publish"]
-    if username is not None:
-        publish.extend(["--username", username])
-    if password is not None:
-        publish.extend(["--password", password])
-    if publish_url is not None:
-        publish.extend(["--publish-url", publish_url])
-    if trusted_publishing:
-        publish.extend(["--trusted-publishing", "always"])
-    if native_tls:
-        publish.append("--native-tls")
-    with TemporaryDirectory() as temp:
-        logged_run(*build_head, str(temp), *build_tail)
-        logged_run(*publish, f"{temp}/*")
+    if targets is None:
+        targets = [
+            PublishTarget(
+                publish_url=publish_url,
+                username=username,
+                password=_to_secret(password),
+                trusted_publishing=trusted_publishing,
+                native_tls=native_tls,
+                check_url=check_url,
+            )
+        ]
+    members = _get_members(root) if workspace else [root]
+    results = {m: PublishResult(name=_get_name(m), root=m) for m in members}
+    with (
+        TemporaryDirectory() as temp,
+        ThreadPoolExecutor(max_workers=max_workers) as build_pool,
+        ThreadPoolExecutor(max_workers=max_workers * len(targets)) as publish_pool,
+    ):
+
+        def build(member: Path, out_dir: Path, /) -> Path | None:
+            result = results[member]
+            for target in targets:
+                skipped = check and target.is_published(member)
+                result.targets[target.name] = TargetResult(skipped=skipped)
+            if result.skipped:
+                return None
+            start = perf_counter()
+            try:
+                out_dir.mkdir()
+                return _build(member, out_dir, cache=cache)
+            finally:
+                result.build = perf_counter() - start
+
+        def upload(
+            target: PublishTarget, dist: Path, /, *, result: TargetResult
+        ) -> None:
+            start = perf_counter()
+            try:
+                logged_run(*target.get_command(), f"{dist}/*")
+            finally:
+                result.publish = perf_counter() - start
+
+        builds = {
+            build_pool.submit(build, m, temp / str(i)): m for i, m in enumerate(members)
+        }
+        uploads: dict[Future[None], TargetResult] = {}
+        dists: set[Path] = set()
+        for future in as_completed(builds):
+            member = builds[future]
+            try:
+                dist = future.result()
+            except Exception as error:  # noqa: BLE001
+                results[member].error = f"Build failed: {error}"
+                continue
+            if dist is None:
+                continue
+            dists.add(dist)
+            for target in targets:
+                result = results[member].targets[target.name]
+                if not result.skipped:
+                    submitted = publish_pool.submit(upload, target, dist, result=result)
+                    uploads[submitted] = result
+        for future in as_completed(uploads):
+            try:
+                future.result()
+            except Exception as error:  # noqa: BLE001
+                uploads[future].error = f"Publish failed: {error}"
+    if cache:
+        _evict(max_size=max_cache_size, keep=dists)
+    for result in results.values():
+        _LOGGER.info("%s", result.describe())
+    if len(failed := [r.name for r in results.values() if not r.ok]) >= 1:
+        msg = f"Failed to publish {len(failed)} package(s): {', '.join(failed)}"
+        raise RuntimeError(msg)
     _LOGGER.info("Finished publishing package")
+    return list(results.values())
+
+
+@dataclass(kw_only=True, slots=True)
+class PublishTarget:
+    publish_url: str | None = None
+    username: str | None = None
+    password: SecretStr | None = None
+    trusted_publishing: bool = False
+    native_tls: bool = False
+    check_url: str | None = None
+
+    @property
+    def name(self) -> str:
+        return "pypi" if self.publish_url is None else self.publish_url
+
+    def get_command(self) -> list[SecretLike]:
+        publish: list[SecretLike] = ["uv", "publish"]
+        if self.username is not None:
+            publish.extend(["--username", self.username])
+        if self.password is not None:
+            publish.extend(["--password", self.password])
+        if self.publish_url is not None:
+            publish.extend(["--publish-url", self.publish_url])
+        if self.trusted_publishing:
+            publish.extend(["--trusted-publishing", "always"])
+        if self.native_tls:
+            publish.append("--native-tls")
+        return publish
+
+    def is_published(self, root: Path, /) -> bool:
+        index = _get_check_url(publish_url=self.publish_url, check_url=self.check_url)
+        if index is None:
+            return False
+        auth = (
+            None
+            if (self.username is None) or (self.password is None)
+            else (self.username, self.password)
+        )
+        return _is_published(root, index, auth=auth)
+
+
+@dataclass(kw_only=True, slots=True)
+class TargetResult:
+    publish: float = 0.0
+    skipped: bool = False
+    error: str | None = None
+
+    def describe(self) -> str:
+        if self.skipped:
+            return "skipped (already published)"
+        status = "ok" if self.error is None else self.error
+        return f"{status} (publish = {self.publish:.2f}s)"
+
+
+@dataclass(kw_only=True, slots=True)
+class PublishResult:
+    name: str
+    root: Path
+    build: float = 0.0
+    targets: dict[str, TargetResult] = field(default_factory=dict)
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return (self.error is None) and all(
+            t.error is None for t in self.targets.values()
+        )
+
+    @property
+    def skipped(self) -> bool:
+        return (len(self.targets) >= 1) and all(
+            t.skipped for t in self.targets.values()
+        )
+
+    def describe(self) -> str:
+        if self.skipped:
+            return f"{self.name}: skipped (already published)"
+        if self.error is not None:
+            return f"{self.name}: {self.error} (build = {self.build:.2f}s)"
+        lines = [f"{self.name}: build = {self.build:.2f}s"]
+        lines.extend(f"  {k}: {v.describe()}" for k, v in self.targets.items())
+        return "\n".join(lines)
+
+
+def load_targets(path: PathLike, /) -> list[PublishTarget]:
+    """Load the publish targets from a YAML file.
+
+    The file is a list of mappings of 'PublishTarget' fields, with distinct
+    names; a password may instead be read from the environment variable named
+    by 'password_env'.
+    Passwords are wrapped in 'SecretStr', so they are masked in the logs.
+    """
+    targets: list[PublishTarget] = []
+    for item in YAML_INSTANCE.load(Path(path).read_text()):
+        kwargs = dict(item)
+        if (name := kwargs.pop("password_env", None)) is not None:
+            try:
+                kwargs["password"] = environ[name]
+            except KeyError:
+                msg = f"Environment variable {name!r} is not set"
+                raise ValueError(msg) from None
+        kwargs["password"] = _to_secret(kwargs.get("password"))
+        target = PublishTarget(**kwargs)
+        if any(t.name == target.name for t in targets):
+            msg = f"{str(path)!r} contains duplicate target {target.name!r}"
+            raise ValueError(msg)
+        targets.append(target)
+    if len(targets) == 0:
+        msg = f"{str(path)!r} does not contain any targets"
+        raise ValueError(msg)
+    return targets
+
+
+def _to_secret(password: SecretLike | None, /) -> SecretStr | None:
+    if (password is None) or isinstance(password, SecretStr):
+        return password
+    return SecretStr(password)
+
+
+def _get_check_url(
+    *, publish_url: str | None = None, check_url: str | None = None
+) -> str | None:
+    """Get the simple API of the index to check for existing versions."""
+    if check_url is not None:
+        return check_url
+    if publish_url is None:
+        return PYPI_SIMPLE_URL
+    try:
+        return CHECK_URLS[publish_url]
+    except KeyError:
+        _LOGGER.warning(
+            "Unable to derive a simple API from %r; not checking the index", publish_url
+        )
+        return None
+
+
+def _is_published(
+    root: Path,
+    index: str,
+    /,
+    *,
+    auth: tuple[str, SecretLike] | None = None,
+    timeout: float = CHECK_TIMEOUT,
+) -> bool:
+    """Check whether the package's version is already on the index."""
+    project = _read_pyproject(root).get("project", {})
+    try:
+        name, version = project["name"], project["version"]
+    except KeyError:
+        _LOGGER.info("%r has no static name & version; not checking", str(root))
+        return False
+    url = f"{index.rstrip('/')}/{_normalize(name)}/"
+    try:
+        response = get(
+            url,
+            headers={"Accept": "application/vnd.pypi.simple.v1+json, text/html;q=0.1"},
+            auth=None if auth is None else (auth[0], extract_secret(auth[1])),
+            timeout=timeout,
+        )
+    except RequestException as error:
+        _LOGGER.warning("Unable to check %r (%s); publishing anyway", url, error)
+        return False
+    if response.status_code == 404:
+        return False
+    if not response.ok:
+        _LOGGER.warning(
+            "Unable to check %r (%d); publishing anyway", url, response.status_code
+        )
+        return False
+    text = response.text
+    is_json = "json" in response.headers.get("Content-Type", "")
+    filenames = (
+        [f["filename"] for f in json_loads(text).get("files", [])]
+        if is_json
+        else [unquote(urlparse(h).path).rsplit("/", 1)[-1] for h in _HREF.findall(text)]
+    )
+    key = (_normalize(name), _normalize_version(version))
+    if any(_parse_filename(f) == key for f in filenames):
+        _LOGGER.info("%s %s is already on %r; skipping", name, version, index)
+        return True
+    return False
+
+
+def _parse_filename(filename: str, /) -> tuple[str, str] | None:
+    """Parse the normalized name & version from a distribution filename."""
+    if filename.endswith(".whl"):
+        parts = filename.split("-")
+        if len(parts) < 5:
+            return None
+        return _normalize(parts[0]), _normalize_version(parts[1])
+    for ext in [".tar.gz", ".zip"]:
+        if filename.endswith(ext):
+            name, _, version = filename.removesuffix(ext).rpartition("-")
+            return (
+                None if name == "" else (_normalize(name), _normalize_version(version))
+            )
+    return None
+
+
+def _normalize(name: str, /) -> str:
+    return sub(r"[-_.]+", "-", name).lower()
+
+
+def _normalize_version(version: str, /) -> str:
+    """Normalize a version per PEP 440, so that '1.0.0-rc1' matches '1.0.0rc1'."""
+    if (match := _VERSION.match(version)) is None:
+        return version.lower()
+    parts: list[str] = []
+    if match["epoch"] is not None and int(match["epoch"]) != 0:
+        parts.append(f"{int(match['epoch'])}!")
+    parts.append(".".join(str(int(p)) for p in match["release"].split(".")))
+    if (pre := match["pre_l"]) is not None:
+        label = _PRE_LABELS.get(pre.lower(), pre.lower())
+        parts.append(f"{label}{int(match['pre_n'] or 0)}")
+    if (match["post_n1"] is not None) or (match["post_l"] is not None):
+        parts.append(f".post{int(match['post_n1'] or match['post_n2'] or 0)}")
+    if match["dev_l"] is not None:
+        parts.append(f".dev{int(match['dev_n'] or 0)}")
+    if (local := match["local"]) is not None:
+        parts.append(f"+{sub(r'[-_]', '.', local.lower())}")
+    return "".join(parts)
+
+
+def _get_members(root: Path, /) -> list[Path]:
+    """Get the members of a 'uv' workspace, including the root if a project."""
+    config = _read_pyproject(root)
+    try:
+        workspace = config["tool"]["uv"]["workspace"]
+    except KeyError:
+        msg = f"{str(root)!r} is not a 'uv' workspace"
+        raise ValueError(msg) from None
+    excluded = {p for g in workspace.get("exclude", []) for p in root.glob(g)}
+    members = [root] if "project" in config else []
+    for glob in workspace.get("members", []):
+        members.extend(
+            p
+            for p in sorted(root.glob(glob))
+            if (p not in excluded) and (p / "pyproject.toml").is_file()
+        )
+    return list(dict.fromkeys(members))
+
+
+def _get_name(root: Path, /) -> str:
+    try:
+        return _read_pyproject(root)["project"]["name"]
+    except KeyError:
+        return root.name
+
+
+def _read_pyproject(root: Path, /) -> dict[str, Any]:
+    try:
+        return loads((root / "pyproject.toml").read_text())
+    except (OSError, TOMLDecodeError):
+        return {}
+
+
+def _build(root: Path, temp: Path, /, *, cache: bool = True) -> Path:
+    """Build the wheel, returning the directory containing it."""
+    key = _get_cache_key(root) if cache else None
+    if key is None:
+        _uv_build(root, temp)
+        return temp
+    wheels = PATH_CACHE / "wheels"
+    path = wheels / key
+    if path.is_dir():
+        _LOGGER.info("Using cached build %r", str(path))
+        utime(path)
+        return path
+    _uv_build(root, temp)
+    wheels.mkdir(parents=True, exist_ok=True)
+    staging = Path(mkdtemp(prefix=".", dir=wheels))
+    try:
+        _ = copytree(temp, staging, dirs_exist_ok=True)
+        _ = staging.replace(path)
+    except OSError:
+        rmtree(staging, ignore_errors=True)
+        return path if path.is_dir() else temp
+    return path
+
+
+def _uv_build(root: Path, out_dir: Path, /) -> None:
+    logged_run(
+        "uv", "build", str(root), "--out-dir", str(out_dir), "--wheel", "--clear"
+    )
+
+
+def _get_cache_key(root: Path, /) -> str | None:
+    """Hash the tracked sources, or None if they are not in a 'git' work tree."""
+    inside = logged_run(
+        "git",
+        "-C",
+        str(root),
+        "rev-parse",
+        "--is-inside-work-tree",
+        suppress=True,
+        return_=True,
+    )
+    if inside != "true":
+        _LOGGER.warning("%r is not a 'git' work tree; not caching", str(root))
+        return None
+    output = logged_run(
+        "git", "-C", str(root), "ls-files", "-z", "--cached", return_=True
+    )
+    hasher = sha256()
+    for name in sorted(set(filter(None, output.split("\0")))):
+        path = root / name
+        try:
+            data = path.read_bytes()
+            mode = path.stat().st_mode
+        except OSError:
+            continue
+        hasher.update(name.encode())
+        hasher.update(b"\0x\0" if mode & 0o111 else b"\0-\0")
+        hasher.update(sha256(data).digest())
+    return hasher.hexdigest()
+
+
+def _evict(*, max_size: int = MAX_CACHE_SIZE, keep: Collection[Path] = ()) -> None:
+    """Evict cached builds, least-recently used first, until under the cap.
+
+    Builds in 'keep' (those used by the current run) are never evicted.
+    """
+    builds: list[tuple[float, int, Path]] = []
+    with suppress(FileNotFoundError):
+        for path in (PATH_CACHE / "wheels").iterdir():
+            if path.name.startswith("."):
+                continue
+            try:
+                size = sum(p.stat().st_size for p in path.iterdir())
+                builds.append((path.stat().st_mtime, size, path))
+            except OSError:
+                continue
+    total = sum(size for _, size, _ in builds)
+    for _, size, path in sorted(builds, key=lambda b: b[0]):
+        if total <= max_size:
+            break
+        if path in keep:
+            continue
+        _LOGGER.info("Evicting cached build %r (size = %d)...", str(path), size)
+        rmtree(path, ignore_errors=True)
+        total -= size
 
 
-__all__ = ["publish_package"]
+__all__ = [
+    "PublishResult",
+    "PublishTarget",
+    "TargetResult",
+    "load_targets",
+    "publish_package",
+]
@@ -1,35 +1,119 @@
 from __future__ import annotations
 
+from contextlib import nullcontext
 from typing import TYPE_CHECKING
 
-from click import Command, command
-from utilities.click import CONTEXT_SETTINGS, option
+from click import Command, UsageError, command
+from utilities.click import CONTEXT_SETTINGS, Str, argument, option
 from utilities.core import is_pytest, set_up_logging
 
 from actions import __version__
-from actions.random_sleep.constants import LOG_FREQ, MAX, MIN, STEP
-from actions.random_sleep.lib import random_sleep
+from actions.random_sleep.constants import (
+    LOG_FREQ,
+    MAX,
+    MAX_WAIT,
+    MIN,
+    RANDOM_SLEEP_SUB_CMD,
+    SLOT_NAME,
+    STEP,
+)
+from actions.random_sleep.lib import random_sleep, yield_host_slot
+from actions.utilities import logged_run
 
 if TYPE_CHECKING:
     from collections.abc import Callable
 
-RANDOM_SLEEP_SUB_CMD = "random-sleep"
-
 
 def make_random_sleep_cmd(
     *, cli: Callable[..., Command] = command, name: str | None = None
 ) -> Command:
+    @argument("command", nargs=-1, type=Str())
     @option("--min", "min_", type=int, default=MIN, help="Minimum duration, in seconds")
     @option("--max", "max_", type=int, default=MAX, help="Maximum duration, in seconds")
     @option("--step", type=int, default=STEP, help="Step duration, in seconds")
     @option("--log-freq", type=int, default=LOG_FREQ, help="Log frequency, in seconds")
-    def func(*, min_: int, max_: int, step: int, log_freq: int) -> None:
+    @option(
+        "--splay-key",
+        type=Str(),
+        default=None,
+        help="Derive a fixed duration from a hash of the hostname & this key",
+    )
+    @option(
+        "--slots",
+        type=int,
+        default=None,
+        help="After sleeping, hold one of this many host-wide slots while running the command after '--'",
+    )
+    @option("--slot-name", type=Str(), default=SLOT_NAME, help="The name of the slots")
+    @option(
+        "--max-load",
+        type=float,
+        default=None,
+        help="After sleeping, wait while the 1-minute load average exceeds this",
+    )
+    @option(
+        "--max-memory-pressure",
+        type=float,
+        default=None,
+        help="After sleeping, wait while the memory pressure (%) exceeds this",
+    )
+    @option(
+        "--max-io-pressure",
+        type=float,
+        default=None,
+        help="After sleeping, wait while the IO pressure (%) exceeds this",
+    )
+    @option(
+        "--max-wait",
+        type=int,
+        default=MAX_WAIT,
+        help="Maximum wait for the load, in seconds",
+    )
+    def func(
+        *,
+        command: tuple[str, ...],
+        min_: int,
+        max_: int,
+        step: int,
+        log_freq: int,
+        splay_key: str | None,
+        slots: int | None,
+        slot_name: str,
+        max_load: float | None,
+        max_memory_pressure: float | None,
+        max_io_pressure: float | None,
+        max_wait: int,
+    ) -> None:
+        if (slots is not None) and (len(command) == 0):
+            msg = "'--slots' requires a command after '--'"
+            raise UsageError(msg)
         if is_pytest():
             return
         set_up_logging(__name__, root=True, log_version=__version__)
-        random_sleep(min=min_, max=max_, step=step, log_freq=log_freq)
+        random_sleep(
+            min=min_,
+            max=max_,
+            step=step,
+            log_freq=log_freq,
+            splay_key=splay_key,
+            max_load=max_load,
+            max_memory_pressure=max_memory_pressure,
+            max_io_pressure=max_io_pressure,
+            max_wait=max_wait,
+        )
+        with (
+            nullcontext()
+            if slots is None
+            else yield_host_slot(slots=slots, name=slot_name, log_freq=log_freq)
+        ):
+            if len(command) >= 1:
+                logged_run(*command, print=True)
 
-    return cli(name=name, help="Random sleep with logging", **CONTEXT_SETTINGS)(func)
+    return cli(
+        name=name,
+        help="Random sleep with logging, then run the command after '--' (if any)",
+        **CONTEXT_SETTINGS,
+    )(func)
 
 
 cli = make_random_sleep_cmd()
@@ -1,9 +1,38 @@
 from __future__ import annotations
 
+from pathlib import Path
+
+import actions.constants
+
+RANDOM_SLEEP_SUB_CMD = "random-sleep"
+PATH_CACHE = actions.constants.PATH_CACHE / RANDOM_SLEEP_SUB_CMD
+
+
 MIN = 0
 MAX = 3600
 STEP = 1
 LOG_FREQ = 60
 
 
-__all__ = ["LOG_FREQ", "MAX", "MIN", "STEP"]
+SLOT_NAME = "default"
+SLOT_POLL = 1.0
+
+
+LOAD_POLL = 5.0
+MAX_WAIT = 3600
+PATH_PRESSURE = Path("/proc/pressure")
+
+
+__all__ = [
+    "LOAD_POLL",
+    "LOG_FREQ",
+    "MAX",
+    "MAX_WAIT",
+    "MIN",
+    "PATH_CACHE",
+    "PATH_PRESSURE",
+    "RANDOM_SLEEP_SUB_CMD",
+    "SLOT_NAME",
+    "SLOT_POLL",
+    "STEP",
+]
@@ -1,13 +1,37 @@
 from __future__ import annotations
 
+from asyncio import sleep as async_sleep
+from contextlib import contextmanager
+from dataclasses import dataclass
+from fcntl import LOCK_EX, LOCK_NB, flock
+from hashlib import sha256
 from math import ceil, floor
+from os import getloadavg
 from random import choice
-from time import sleep
+from time import monotonic, sleep
+from typing import TYPE_CHECKING
 
-from utilities.core import get_now, to_logger
-from whenever import TimeDelta, ZonedDateTime
+from utilities.constants import HOSTNAME
+from utilities.core import to_logger
+from whenever import TimeDelta
+
+from actions.random_sleep.constants import (
+    LOAD_POLL,
+    LOG_FREQ,
+    MAX,
+    MAX_WAIT,
+    MIN,
+    PATH_CACHE,
+    PATH_PRESSURE,
+    SLOT_NAME,
+    SLOT_POLL,
+    STEP,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
 
-from actions.random_sleep.constants import LOG_FREQ, MAX, MIN, STEP
 
 _LOGGER = to_logger(__name__)
 
@@ -18,35 +42,231 @@ def random_sleep(
     max: int = MAX,  # noqa: A002
     step: int = STEP,
     log_freq: int = LOG_FREQ,
+    splay_key: str | None = None,
+    max_load: float | None = None,
+    max_memory_pressure: float | None = None,
+    max_io_pressure: float | None = None,
+    max_wait: int = MAX_WAIT,
 ) -> None:
-    _LOGGER.info("Sleeping...")
-    start = get_now()
-    duration = TimeDelta(seconds=choice(range(min, max, step)))
-    _LOGGER.info("Sleeping for %s...", duration)
-    end = (start + duration).round(mode="ceil")
-    while (now := get_now()) < end:
-        _intermediate(start, now, end, log_freq=log_freq)
+    """Sleep for a random duration.
+
+    If 'splay_key' is given, the duration is instead derived from a hash of the
+    hostname & the key, so each host keeps a fixed slot within the window.
+
+    If any of 'max_load' (the 1-minute load average), 'max_memory_pressure' or
+    'max_io_pressure' (the 10-second 'some' PSI percentages) are given, then
+    keep waiting afterwards while any is exceeded, for at most 'max_wait'.
+    """
+    duration = _start(min=min, max=max, step=step, splay_key=splay_key)
+    for this_sleep in _yield_sleeps(duration, log_freq=log_freq):
+        sleep(this_sleep)
+    thresholds = _Thresholds(
+        load=max_load, memory=max_memory_pressure, io=max_io_pressure
+    )
+    for this_sleep in _yield_load_waits(
+        thresholds, max_wait=max_wait, log_freq=log_freq
+    ):
+        sleep(this_sleep)
     _LOGGER.info("Finished sleeping")
 
 
-def _intermediate(
-    start: ZonedDateTime,
-    now: ZonedDateTime,
-    end: ZonedDateTime,
-    /,
+async def random_sleep_async(
     *,
+    min: int = MIN,  # noqa: A002
+    max: int = MAX,  # noqa: A002
+    step: int = STEP,
     log_freq: int = LOG_FREQ,
+    splay_key: str | None = None,
+    max_load: float | None = None,
+    max_memory_pressure: float | None = None,
+    max_io_pressure: float | None = None,
+    max_wait: int = MAX_WAIT,
 ) -> None:
-    elapsed = TimeDelta(seconds=floor((now - start).in_seconds()))
-    remaining = TimeDelta(seconds=ceil((end - now).in_seconds()))
-    this_sleep = min(remaining, TimeDelta(seconds=log_freq))
+    """Sleep for a random duration, asynchronously."""
+    duration = _start(min=min, max=max, step=step, splay_key=splay_key)
+    for this_sleep in _yield_sleeps(duration, log_freq=log_freq):
+        await async_sleep(this_sleep)
+    thresholds = _Thresholds(
+        load=max_load, memory=max_memory_pressure, io=max_io_pressure
+    )
+    for this_sleep in _yield_load_waits(
+        thresholds, max_wait=max_wait, log_freq=log_freq
+    ):
+        await async_sleep(this_sleep)
+    _LOGGER.info("Finished sleeping")
+
+
+def _start(
+    *,
+    min: int = MIN,  # noqa: A002
+    max: int = MAX,  # noqa: A002
+    step: int = STEP,
+    splay_key: str | None = None,
+) -> int:
+    _LOGGER.info("Sleeping...")
+    duration = _get_duration(min=min, max=max, step=step, splay_key=splay_key)
+    _LOGGER.info("Sleeping for %s...", TimeDelta(seconds=duration))
+    return duration
+
+
+def _get_duration(
+    *,
+    min: int = MIN,  # noqa: A002
+    max: int = MAX,  # noqa: A002
+    step: int = STEP,
+    splay_key: str | None = None,
+    hostname: str = HOSTNAME,
+) -> int:
+    durations = range(min, max, step)
+    if splay_key is None:
+        return choice(durations)
+    digest = sha256(f"{hostname}:{splay_key}".encode()).digest()
+    return durations[int.from_bytes(digest[:8]) % len(durations)]
+
+
+def _yield_sleeps(duration: float, /, *, log_freq: int = LOG_FREQ) -> Iterator[float]:
+    """Yield the sleeps, in seconds, making up a duration on the monotonic clock.
+
+    Progress is logged before each sleep, which lasts at most 'log_freq'.
+    """
+    start = monotonic()
+    end = start + duration
+    while (now := monotonic()) < end:
+        remaining = end - now
+        this_sleep = min(remaining, log_freq)
+        _LOGGER.info(
+            "Sleeping for %s... (elapsed = %s, remaining = %s)",
+            TimeDelta(seconds=ceil(this_sleep)),
+            TimeDelta(seconds=floor(now - start)),
+            TimeDelta(seconds=ceil(remaining)),
+        )
+        yield this_sleep
+
+
+def _yield_load_waits(
+    thresholds: _Thresholds,
+    /,
+    *,
+    max_wait: int = MAX_WAIT,
+    log_freq: int = LOG_FREQ,
+    poll: float = LOAD_POLL,
+) -> Iterator[float]:
+    """Yield the waits, in seconds, until the host is within the thresholds."""
+    if thresholds.is_empty:
+        return
+    start = monotonic()
+    end = start + max_wait
+    last_log: float | None = None
+    while len(exceeded := thresholds.get_exceeded()) >= 1:
+        if (now := monotonic()) >= end:
+            _LOGGER.warning(
+                "Giving up waiting for load after %s (%s)",
+                TimeDelta(seconds=floor(now - start)),
+                ", ".join(exceeded),
+            )
+            return
+        if (last_log is None) or (now - last_log >= log_freq):
+            _LOGGER.info(
+                "Waiting for load... (%s; elapsed = %s, remaining = %s)",
+                ", ".join(exceeded),
+                TimeDelta(seconds=floor(now - start)),
+                TimeDelta(seconds=ceil(end - now)),
+            )
+            last_log = now
+        yield min(poll, end - now)
     _LOGGER.info(
-        "Sleeping for %s... (elapsed = %s, remaining = %s)",
-        this_sleep,
-        elapsed,
-        remaining,
+        "Load is within thresholds (waited %s)",
+        TimeDelta(seconds=floor(monotonic() - start)),
     )
-    sleep(round(this_sleep.in_seconds()))
 
 
-__all__ = ["random_sleep"]
+@dataclass(kw_only=True, slots=True)
+class _Thresholds:
+    load: float | None = None
+    memory: float | None = None
+    io: float | None = None
+
+    @property
+    def is_empty(self) -> bool:
+        return (self.load is None) and (self.memory is None) and (self.io is None)
+
+    def get_exceeded(self) -> list[str]:
+        """Describe the readings which exceed their thresholds."""
+        exceeded: list[str] = []
+        if (self.load is not None) and ((load := getloadavg()[0]) > self.load):
+            exceeded.append(f"load = {load:.2f} > {self.load}")
+        for name, threshold in [("memory", self.memory), ("io", self.io)]:
+            if threshold is None:
+                continue
+            pressure = _read_pressure(name)
+            if (pressure is not None) and (pressure > threshold):
+                exceeded.append(f"{name} pressure = {pressure:.2f}% > {threshold}%")
+        return exceeded
+
+
+def _read_pressure(name: str, /, *, root: Path = PATH_PRESSURE) -> float | None:
+    """Read the 10-second 'some' PSI percentage, if available."""
+    try:
+        text = (root / name).read_text()
+    except OSError:
+        return None
+    for line in text.splitlines():
+        kind, *fields = line.split()
+        if kind == "some":
+            values = dict(f.split("=", 1) for f in fields)
+            return float(values["avg10"])
+    return None
+
+
+##
+
+
+@contextmanager
+def yield_host_slot(
+    *,
+    slots: int,
+    name: str = SLOT_NAME,
+    log_freq: int = LOG_FREQ,
+    poll: float = SLOT_POLL,
+) -> Iterator[int]:
+    """Hold one of a number of host-wide slots, waiting for one to be free.
+
+    Each slot is an exclusive lock on a file under the cache, so it is released
+    if the holder dies.
+    """
+    if slots <= 0:
+        msg = f"'slots' must be positive; got {slots}"
+        raise ValueError(msg)
+    path = PATH_CACHE / "slots" / name
+    path.mkdir(parents=True, exist_ok=True)
+    _LOGGER.info("Acquiring one of %d slot(s) for %r...", slots, name)
+    start = last_log = monotonic()
+    while True:
+        for slot in range(slots):
+            file = (path / f"{slot}.lock").open(mode="a")
+            try:
+                flock(file.fileno(), LOCK_EX | LOCK_NB)
+            except BlockingIOError:
+                file.close()
+                continue
+            _LOGGER.info(
+                "Acquired slot %d for %r (waited %s)",
+                slot,
+                name,
+                TimeDelta(seconds=floor(monotonic() - start)),
+            )
+            with file:
+                yield slot
+            return
+        if (now := monotonic()) - last_log >= log_freq:
+            _LOGGER.info(
+                "Waiting for one of %d slot(s) for %r... (elapsed = %s)",
+                slots,
+                name,
+                TimeDelta(seconds=floor(now - start)),
+            )
+            last_log = now
+        sleep(poll)
+
+
+__all__ = ["random_sleep", "random_sleep_async", "yield_host_slot"]
@@ -3,12 +3,13 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 import utilities.click
-from click import Command, argument, command, option
-from utilities.click import CONTEXT_SETTINGS, Str
+from click import Command, argument, command, echo, option
+from utilities.click import CONTEXT_SETTINGS, Str, flag
 from utilities.core import is_pytest, set_up_logging
 from utilities.types import PathLike
 
 from actions import __version__
+from actions.re_encrypt.constants import MAX_WORKERS, RE_ENCRYPT_SUB_CMD
 from actions.re_encrypt.lib import re_encrypt
 
 if TYPE_CHECKING:
@@ -17,13 +18,10 @@ if TYPE_CHECKING:
     from utilities.types import PathLike, SecretLike
 
 
-RE_ENCRYPT_SUB_CMD = "re-encrypt"
-
-
 def make_re_encrypt_cmd(
     *, cli: Callable[..., Command] = command, name: str | None = None
 ) -> Command:
-    @argument("path", type=utilities.click.Path(exist="existing file"))
+    @argument("paths", nargs=-1, required=True, type=Str())
     @option(
         "--key-file",
         type=utilities.click.Path(exist="file if exists"),
@@ -43,22 +41,100 @@ def make_re_encrypt_cmd(
         default=None,
         help="The new age identity for encryption, if different",
     )
+    @option(
+        "--max-workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="The number of files to re-encrypt concurrently",
+    )
+    @flag(
+        "--audit",
+        default=False,
+        help="List the files which would be re-encrypted, without changing them",
+    )
+    @flag(
+        "--force",
+        default=False,
+        help="Re-encrypt even the files already encrypted to the recipient",
+    )
+    @flag(
+        "--no-resume",
+        default=False,
+        help="Re-encrypt the files completed by an earlier, failed run to the recipient",
+    )
+    @option(
+        "--since",
+        type=Str(),
+        default=None,
+        help="Only re-encrypt the files changed since this 'git' ref",
+    )
+    @option(
+        "--recipient",
+        "recipients",
+        type=Str(),
+        multiple=True,
+        help="An age recipient to encrypt to, as well as the (new) key",
+    )
+    @flag(
+        "--drop-key",
+        default=False,
+        help="Do not also encrypt to the (new) key, leaving only the recipients",
+    )
+    @option(
+        "--key-group",
+        "key_groups",
+        type=Str(),
+        multiple=True,
+        help="A comma-separated key group of age recipients, instead of the above",
+    )
+    @option(
+        "--shamir-threshold",
+        type=int,
+        default=None,
+        help="The number of key groups needed to decrypt",
+    )
     def func(
         *,
-        path: PathLike,
+        paths: tuple[str, ...],
         key_file: PathLike | None = None,
         key: SecretLike | None = None,
         new_key_file: PathLike | None = None,
         new_key: SecretLike | None = None,
+        max_workers: int = MAX_WORKERS,
+        audit: bool = False,
+        force: bool = False,
+        no_resume: bool = False,
+        since: str | None = None,
+        recipients: tuple[str, ...] = (),
+        drop_key: bool = False,
+        key_groups: tuple[str, ...] = (),
+        shamir_threshold: int | None = None,
     ) -> None:
         if is_pytest():
             return
         set_up_logging(__name__, root=True, log_version=__version__)
-        re_encrypt(
-            path, key_file=key_file, key=key, new_key_file=new_key_file, new_key=new_key
+        results = re_encrypt(
+            *paths,
+            key_file=key_file,
+            key=key,
+            new_key_file=new_key_file,
+            new_key=new_key,
+            max_workers=max_workers,
+            audit=audit,
+            force=force,
+            resume=not no_resume,
+            since=since,
+            recipients=recipients,
+            drop_key=drop_key,
+            key_groups=[g.split(",") for g in key_groups],
+            shamir_threshold=shamir_threshold,
         )
+        if audit:
+            for result in results:
+                if result.stale:
+                    echo(str(result.path))
 
-    return cli(name=name, help="Re-encrypt a JSON file", **CONTEXT_SETTINGS)(func)
+    return cli(name=name, help="Re-encrypt JSON files", **CONTEXT_SETTINGS)(func)
 
 
 cli = make_re_encrypt_cmd()
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+from utilities.constants import CPU_COUNT
+
+import actions.constants
+
+RE_ENCRYPT_SUB_CMD = "re-encrypt"
+MAX_WORKERS = CPU_COUNT
+PATH_CACHE = actions.constants.PATH_CACHE / RE_ENCRYPT_SUB_CMD
+
+
+__all__ = ["MAX_WORKERS", "PATH_CACHE", "RE_ENCRYPT_SUB_CMD"]
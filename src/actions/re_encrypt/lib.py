@@ -1,102 +1,567 @@
 from __future__ import annotations
 
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from glob import glob, has_magic
+from hashlib import sha256
+from json import JSONDecodeError, dumps, loads
 from os import environ
 from pathlib import Path
-from typing import TYPE_CHECKING, assert_never
+from subprocess import PIPE, CalledProcessError, Popen
+from subprocess import run as subprocess_run
+from tempfile import mkstemp
+from threading import Lock
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Self, assert_never
 
 from pydantic import SecretStr
-from utilities.core import TemporaryFile, to_logger, write_text, yield_temp_environ
+from utilities.constants import PWD
+from utilities.core import TemporaryDirectory, TemporaryFile, to_logger
 from utilities.pydantic import extract_secret
-from utilities.subprocess import run
 from xdg_base_dirs import xdg_config_home
 
+from actions.re_encrypt.constants import MAX_WORKERS, PATH_CACHE
+from actions.utilities import logged_run
+
 if TYPE_CHECKING:
-    from collections.abc import Iterator
+    from collections.abc import Iterable, Mapping, Sequence
 
-    from utilities.types import PathLike, SecretLike
+    from utilities.types import PathLike, SecretLike, StrStrMapping
 
 
 _LOGGER = to_logger(__name__)
+_RECIPIENTS: dict[tuple[str, ...], str] = {}
+_SOPS_KEY_TYPES = ("age", "azure_kv", "gcp_kms", "hc_vault", "key_groups", "kms", "pgp")
 
 
 def re_encrypt(
-    path: PathLike,
-    /,
-    *,
+    *paths: PathLike,
     key_file: PathLike | None = None,
     key: SecretLike | None = None,
     new_key_file: PathLike | None = None,
     new_key: SecretLike | None = None,
-) -> None:
-    """Re-encrypt a JSON file."""
+    max_workers: int = MAX_WORKERS,
+    audit: bool = False,
+    force: bool = False,
+    resume: bool = True,
+    since: str | None = None,
+    recipients: Iterable[str] = (),
+    drop_key: bool = False,
+    key_groups: Iterable[Iterable[str]] = (),
+    shamir_threshold: int | None = None,
+) -> list[ReEncryptResult]:
+    """Re-encrypt a set of JSON files.
+
+    The paths may be globs. The new recipient is derived once, then the files
+    are decrypted & re-encrypted concurrently.
+
+    If 'recipients' are given, the files are encrypted to them all, together
+    with the recipient of the new key (or else the current key) unless
+    'drop_key' is set. If 'key_groups' are
+    given, the files are instead encrypted to those groups, any 'shamir_threshold'
+    of which are needed to decrypt.
+
+    Files whose metadata shows they are already encrypted to the recipients alone
+    are skipped, unless 'force' is set. If 'audit' is set, nothing is changed;
+    the results only flag the files which are stale.
+
+    If 'resume' is set, each completed file is recorded in a manifest for the
+    recipient, so re-running a failed or interrupted rotation skips the files it
+    has already done; the manifest is removed once a run has no failures. If
+    'since' is given, only the files changed since that 'git' ref are considered.
+    """
     _LOGGER.info("Re-encrypting...")
-    with _yield_env(key_file=key_file, key=key):
-        decrypted = run(
-            "sops",
-            "decrypt",
-            "--input-type",
-            "json",
-            "--output-type",
-            "json",
-            "--ignore-mac",
-            str(path),
-            return_=True,
-        )
-    with _yield_env(
+    files = _expand(*paths)
+    if since is not None:
+        changed = _get_changed(since)
+        files = [f for f in files if f.resolve() in changed]
+        _LOGGER.info("%d file(s) changed since %r", len(files), since)
+    env = _get_env(key_file=key_file, key=key)
+    new_env = _get_env(
         key_file=key_file if new_key_file is None else new_key_file,
         key=key if new_key is None else new_key,
+    )
+    target = _get_target(
+        new_env,
+        recipients=recipients,
+        key_groups=key_groups,
+        shamir_threshold=shamir_threshold,
+        drop_key=drop_key,
+    )
+    manifest = _Manifest.open(target.key) if resume and not audit else None
+    with (
+        TemporaryDirectory() as temp,
+        ThreadPoolExecutor(max_workers=max_workers) as pool,
     ):
-        identity = _get_recipient()
-    with TemporaryFile(text=decrypted) as temp:
-        encrypted = run(
-            "sops",
-            "encrypt",
-            "--age",
-            identity,
-            "--input-type",
-            "json",
-            "--output-type",
-            "json",
-            str(temp),
-            return_=True,
+        if len(target.groups) >= 2:
+            config = temp / ".sops.yaml"
+            _ = config.write_text(target.to_config())
+            target.config = config
+        func = partial(
+            _re_encrypt_one,
+            env=env,
+            target=target,
+            audit=audit,
+            force=force,
+            manifest=manifest,
         )
-    write_text(path, encrypted, overwrite=True)
+        results = list(pool.map(func, files))
+    for result in results:
+        _LOGGER.info("%s", result.describe())
+    if len(failed := [r for r in results if r.error is not None]) >= 1:
+        desc = ", ".join(str(r.path) for r in failed)
+        msg = f"Failed to re-encrypt {len(failed)} file(s): {desc}"
+        raise RuntimeError(msg)
+    if manifest is not None:
+        manifest.remove()
     _LOGGER.info("Finished re-encrypting")
+    return results
+
+
+@dataclass(kw_only=True, slots=True)
+class ReEncryptResult:
+    path: Path
+    stale: bool = True
+    re_encrypted: bool = False
+    duration: float = 0.0
+    error: str | None = None
+
+    def describe(self) -> str:
+        if self.error is not None:
+            status = self.error
+        elif not self.stale:
+            status = "up to date"
+        elif self.re_encrypted:
+            status = "re-encrypted"
+        else:
+            status = "stale"
+        return f"{str(self.path)!r}: {status} ({self.duration:.2f}s)"
+
+
+def _expand(*paths: PathLike) -> list[Path]:
+    """Expand the paths & globs, in order & without duplicates."""
+    files: list[Path] = []
+    for path in map(str, paths):
+        if not has_magic(path):
+            files.append(Path(path))
+            continue
+        if len(matches := sorted(glob(path, recursive=True))) == 0:  # noqa: PTH207
+            msg = f"{path!r} does not match any files"
+            raise ValueError(msg)
+        files.extend(Path(m) for m in matches if Path(m).is_file())
+    return list(dict.fromkeys(files))
+
+
+def _re_encrypt_one(
+    path: Path,
+    /,
+    *,
+    env: StrStrMapping,
+    target: _Target,
+    audit: bool = False,
+    force: bool = False,
+    manifest: _Manifest | None = None,
+) -> ReEncryptResult:
+    result = ReEncryptResult(path=path)
+    start = perf_counter()
+    try:
+        current = _read_target(path)
+        result.stale = force or (current is None) or (current.key != target.key)
+        if result.stale and (manifest is not None):
+            digest = _hash(path)
+            result.stale = not manifest.is_completed(path, digest)
+        else:
+            digest = None
+        if result.stale and not audit:
+            _pipe(path, env=env, target=target)
+            result.re_encrypted = True
+            if (manifest is not None) and (digest is not None):
+                manifest.record(path, _hash(path))
+    except (CalledProcessError, OSError) as error:
+        result.error = _describe_error(error)
+    finally:
+        result.duration = perf_counter() - start
+    return result
+
+
+def _get_changed(since: str, /, *, cwd: Path = PWD) -> set[Path]:
+    """Get the files changed since a 'git' ref, including uncommitted changes."""
+    root = Path(
+        logged_run("git", "-C", str(cwd), "rev-parse", "--show-toplevel", return_=True)
+    )
+    output = logged_run(
+        "git", "-C", str(root), "diff", "--name-only", "-z", since, return_=True
+    )
+    return {(root / name).resolve() for name in output.split("\0") if name != ""}
+
+
+def _hash(path: Path, /) -> str:
+    return sha256(path.read_bytes()).hexdigest()
+
+
+@dataclass(kw_only=True, slots=True)
+class _Manifest:
+    """An append-only record of the files re-encrypted to a target in a rotation.
+
+    Each line records a file's path & its hash once re-encrypted; a torn final
+    line, from a run which died, is ignored.
+    """
+
+    path: Path
+    completed: dict[str, str] = field(default_factory=dict)
+    lock: Lock = field(default_factory=Lock)
+
+    @classmethod
+    def open(cls, target: str, /) -> Self:
+        digest = sha256(target.encode()).hexdigest()[:16]
+        path = PATH_CACHE / "manifests" / f"{digest}.jsonl"
+        completed: dict[str, str] = {}
+        try:
+            lines = path.read_text().splitlines()
+        except FileNotFoundError:
+            lines = []
+        for line in lines:
+            try:
+                entry = loads(line)
+                completed[entry["path"]] = entry["hash"]
+            except (JSONDecodeError, KeyError):
+                continue
+        if len(completed) >= 1:
+            _LOGGER.info("Resuming from %r (%d file(s))", str(path), len(completed))
+        return cls(path=path, completed=completed)
+
+    def is_completed(self, path: Path, digest: str, /) -> bool:
+        """Check if the file was completed & is unchanged since."""
+        return self.completed.get(str(path.resolve())) == digest
+
+    def record(self, path: Path, digest: str, /) -> None:
+        key = str(path.resolve())
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open(mode="a") as file:
+                _ = file.write(f"{dumps({'path': key, 'hash': digest})}\n")
+            self.completed[key] = digest
+
+    def remove(self) -> None:
+        """Remove the manifest, ending the rotation."""
+        with self.lock:
+            self.path.unlink(missing_ok=True)
+            self.completed.clear()
+
+
+def _read_target(path: Path, /) -> _Target | None:
+    """Read the age key groups from the plaintext 'sops' metadata.
+
+    None is returned if the file is also encrypted to any other kind of key, or
+    its metadata cannot be read.
+    """
+    try:
+        metadata = loads(path.read_bytes())["sops"]
+        if (key_groups := metadata.get("key_groups")) is None:
+            key_groups = [metadata]
+        elif _has_other_keys(metadata, allowed={"key_groups"}):
+            return None
+        groups: list[frozenset[str]] = []
+        for group in key_groups:
+            if _has_other_keys(group, allowed={"age"}):
+                return None
+            groups.append(frozenset(e["recipient"] for e in group.get("age") or []))
+    except (AttributeError, JSONDecodeError, KeyError, TypeError, UnicodeDecodeError):
+        return None
+    return _Target(groups=tuple(groups), threshold=metadata.get("shamir_threshold"))
+
+
+def _has_other_keys(metadata: Mapping[str, Any], /, *, allowed: set[str]) -> bool:
+    return any(metadata.get(k) for k in _SOPS_KEY_TYPES if k not in allowed)
+
+
+def _pipe(path: Path, /, *, env: StrStrMapping, target: _Target) -> None:
+    """Decrypt a file straight into its re-encryption, then replace it atomically.
+
+    The plaintext only passes through a pipe between the two 'sops' processes;
+    the ciphertext is written to a temporary file beside the target.
+    """
+    full_env = {**environ, **env}
+    decrypt_cmd = [
+        "sops",
+        "decrypt",
+        "--input-type",
+        "json",
+        "--output-type",
+        "json",
+        "--ignore-mac",
+        str(path),
+    ]
+    encrypt_cmd = [
+        *target.get_encrypt_cmd(),
+        "--input-type",
+        "json",
+        "--output-type",
+        "json",
+        "/dev/stdin",
+    ]
+    fd, name = mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    temp = Path(name)
+    try:
+        with (
+            open(fd, mode="wb") as out,  # noqa: PTH123
+            Popen(decrypt_cmd, stdout=PIPE, stderr=PIPE, env=full_env) as decrypt,
+        ):
+            with Popen(
+                encrypt_cmd, stdin=decrypt.stdout, stdout=out, stderr=PIPE, env=full_env
+            ) as encrypt:
+                if decrypt.stdout is not None:
+                    decrypt.stdout.close()
+                _, encrypt_err = encrypt.communicate()
+            decrypt_err = b"" if decrypt.stderr is None else decrypt.stderr.read()
+        _check_returncode(decrypt, decrypt_cmd, decrypt_err)
+        _check_returncode(encrypt, encrypt_cmd, encrypt_err)
+        temp.chmod(path.stat().st_mode & 0o7777)
+        _ = temp.replace(path)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
 
 
-@contextmanager
-def _yield_env(
+def _check_returncode(proc: Popen[bytes], cmd: Sequence[str], err: bytes, /) -> None:
+    if proc.returncode != 0:
+        raise CalledProcessError(proc.returncode, cmd, stderr=err.decode())
+
+
+def _run(*args: str, env: StrStrMapping) -> str:
+    """Run a command with extra environment variables, returning its output.
+
+    The environment is passed explicitly, rather than set on the process, so
+    that commands in different threads can use different keys.
+    """
+    return subprocess_run(
+        args, capture_output=True, check=True, text=True, env={**environ, **env}
+    ).stdout
+
+
+def _describe_error(error: Exception, /) -> str:
+    if isinstance(error, CalledProcessError) and error.stderr:
+        return f"'{' '.join(error.cmd[:2])}' failed: {error.stderr.strip()}"
+    return str(error)
+
+
+def _get_env(
     *, key_file: PathLike | None = None, key: SecretLike | None = None
-) -> Iterator[None]:
+) -> dict[str, str]:
     match key_file, key:
         case Path() | str(), _:
-            with yield_temp_environ(SOPS_AGE_KEY_FILE=str(key_file)):
-                yield
+            return {"SOPS_AGE_KEY_FILE": str(key_file)}
         case None, SecretStr() | str():
-            with yield_temp_environ(SOPS_AGE_KEY=extract_secret(key)):
-                yield
+            return {"SOPS_AGE_KEY": extract_secret(key)}
         case None, None:
             path = xdg_config_home() / "sops/age/keys.txt"
-            with yield_temp_environ(SOPS_AGE_KEY_FILE=str(path)):
-                yield
+            return {"SOPS_AGE_KEY_FILE": str(path)}
         case never:
             assert_never(never)
 
 
-def _get_recipient() -> str:
+def _get_target(
+    new_env: StrStrMapping,
+    /,
+    *,
+    recipients: Iterable[str] = (),
+    key_groups: Iterable[Iterable[str]] = (),
+    shamir_threshold: int | None = None,
+    drop_key: bool = False,
+) -> _Target:
+    groups = tuple(frozenset(g) for g in key_groups)
+    recipient_set = set(recipients)
+    if len(groups) >= 1:
+        if len(recipient_set) >= 1:
+            msg = "'recipients' and 'key_groups' are mutually exclusive"
+            raise ValueError(msg)
+        if any(len(g) == 0 for g in groups):
+            msg = "Key groups must be non-empty"
+            raise ValueError(msg)
+        return _Target(groups=groups, threshold=shamir_threshold)
+    if not drop_key:
+        recipient_set.add(_get_recipient(new_env))
+    elif len(recipient_set) == 0:
+        msg = "'drop_key' requires 'recipients'"
+        raise ValueError(msg)
+    return _Target(groups=(frozenset(recipient_set),))
+
+
+@dataclass(kw_only=True, slots=True)
+class _Target:
+    """The age key groups to encrypt to."""
+
+    groups: tuple[frozenset[str], ...]
+    threshold: int | None = None
+    config: Path | None = None
+
+    @property
+    def key(self) -> str:
+        """A canonical description, ignoring the order of & within the groups."""
+        groups = sorted(sorted(g) for g in self.groups)
+        if len(groups) == 1:
+            return dumps({"groups": groups})
+        threshold = len(groups) if self.threshold is None else self.threshold
+        return dumps({"groups": groups, "threshold": threshold})
+
+    def get_encrypt_cmd(self) -> list[str]:
+        if self.config is None:
+            (group,) = self.groups
+            return ["sops", "encrypt", "--age", ",".join(sorted(group))]
+        return ["sops", "--config", str(self.config), "encrypt"]
+
+    def to_config(self) -> str:
+        """Render a '.sops.yaml' with one creation rule for the key groups.
+
+        It is written as JSON, which is also YAML.
+        """
+        rule: dict[str, Any] = {"key_groups": [{"age": sorted(g)} for g in self.groups]}
+        if self.threshold is not None:
+            rule["shamir_threshold"] = self.threshold
+        return dumps({"creation_rules": [rule]})
+
+
+def _get_recipient(env: StrStrMapping, /) -> str:
+    """Get the recipient of the key, memoized on the key file or fingerprint."""
     try:
-        key_file = environ["SOPS_AGE_KEY_FILE"]
+        key_file = Path(env["SOPS_AGE_KEY_FILE"])
     except KeyError:
-        with TemporaryFile(text=environ["SOPS_AGE_KEY"]) as temp:
-            return _get_recipient_from_path(temp)
+        text = env["SOPS_AGE_KEY"]
+        cache_key = ("key", sha256(text.encode()).hexdigest())
+        if (recipient := _RECIPIENTS.get(cache_key)) is None:
+            recipient = _derive_recipient(text)
     else:
-        return _get_recipient_from_path(key_file)
+        cache_key = ("file", str(key_file.resolve()), str(key_file.stat().st_mtime_ns))
+        if (recipient := _RECIPIENTS.get(cache_key)) is None:
+            recipient = _derive_recipient(key_file.read_text(), path=key_file)
+    _RECIPIENTS[cache_key] = recipient
+    return recipient
+
+
+def _derive_recipient(text: str, /, *, path: PathLike | None = None) -> str:
+    """Derive the recipient of the first identity, falling back to 'age-keygen'."""
+    for line in text.splitlines():
+        if line.startswith("AGE-SECRET-KEY-1"):
+            try:
+                return _to_recipient(line.strip())
+            except ValueError:
+                break
+    _LOGGER.info("Unable to derive the recipient in-process; using 'age-keygen'")
+    if path is not None:
+        return _get_recipient_from_path(path)
+    with TemporaryFile(text=text) as temp:
+        return _get_recipient_from_path(temp)
 
 
 def _get_recipient_from_path(path: PathLike, /) -> str:
-    recipient, *_ = run("age-keygen", "-y", str(path), return_=True).splitlines()
+    recipient, *_ = _run("age-keygen", "-y", str(path), env={}).splitlines()
     return recipient
 
 
-__all__ = ["re_encrypt"]
+##
+
+
+_BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+_BECH32_GENERATOR = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+_X25519_P = 2**255 - 19
+_X25519_A24 = 121665
+_X25519_BASE = 9
+
+
+def _to_recipient(identity: str, /) -> str:
+    """Convert an 'AGE-SECRET-KEY-1...' identity to its 'age1...' recipient."""
+    hrp, scalar = _bech32_decode(identity)
+    if (hrp != "age-secret-key-") or (len(scalar) != 32):
+        msg = "Invalid age identity"
+        raise ValueError(msg)
+    return _bech32_encode("age", _x25519(scalar, _X25519_BASE))
+
+
+def _bech32_decode(text: str, /) -> tuple[str, bytes]:
+    """Decode a BIP 173 string, without its length limit."""
+    if (text != text.lower()) and (text != text.upper()):
+        msg = "Mixed-case bech32 string"
+        raise ValueError(msg)
+    hrp, sep, data = text.lower().rpartition("1")
+    if (sep == "") or (hrp == "") or (len(data) < 6):
+        msg = "Invalid bech32 string"
+        raise ValueError(msg)
+    try:
+        values = [_BECH32_CHARSET.index(c) for c in data]
+    except ValueError:
+        msg = "Invalid bech32 character"
+        raise ValueError(msg) from None
+    if _bech32_polymod([*_bech32_hrp_expand(hrp), *values]) != 1:
+        msg = "Invalid bech32 checksum"
+        raise ValueError(msg)
+    return hrp, bytes(_convert_bits(values[:-6], 5, 8, pad=False))
+
+
+def _bech32_encode(hrp: str, data: bytes, /) -> str:
+    values = _convert_bits(data, 8, 5, pad=True)
+    polymod = _bech32_polymod([*_bech32_hrp_expand(hrp), *values, *[0] * 6]) ^ 1
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return f"{hrp}1{''.join(_BECH32_CHARSET[v] for v in [*values, *checksum])}"
+
+
+def _bech32_hrp_expand(hrp: str, /) -> list[int]:
+    return [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+
+
+def _bech32_polymod(values: Iterable[int], /) -> int:
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ value
+        for i, gen in enumerate(_BECH32_GENERATOR):
+            if (top >> i) & 1:
+                chk ^= gen
+    return chk
+
+
+def _convert_bits(
+    data: Iterable[int], from_: int, to: int, /, *, pad: bool
+) -> list[int]:
+    acc = bits = 0
+    out: list[int] = []
+    max_value = (1 << to) - 1
+    for value in data:
+        acc = (acc << from_) | value
+        bits += from_
+        while bits >= to:
+            bits -= to
+            out.append((acc >> bits) & max_value)
+    if pad and (bits > 0):
+        out.append((acc << (to - bits)) & max_value)
+    elif (not pad) and ((bits >= from_) or ((acc << (to - bits)) & max_value)):
+        msg = "Invalid bech32 padding"
+        raise ValueError(msg)
+    return out
+
+
+def _x25519(scalar: bytes, u: int, /) -> bytes:
+    """Multiply a point by a scalar on Curve25519, per RFC 7748."""
+    p = _X25519_P
+    k = int.from_bytes(scalar, "little")
+    k = (k & ~7 & ~(1 << 255)) | (1 << 254)
+    x2, z2, x3, z3 = 1, 0, u, 1
+    swap = 0
+    for t in reversed(range(255)):
+        bit = (k >> t) & 1
+        if swap ^ bit:
+            x2, x3, z2, z3 = x3, x2, z3, z2
+        swap = bit
+        a, b = x2 + z2, x2 - z2
+        c, d = x3 + z3, x3 - z3
+        aa, bb = a * a % p, b * b % p
+        da, cb = d * a % p, c * b % p
+        e = (aa - bb) % p
+        x3, z3 = (da + cb) ** 2 % p, u * (da - cb) ** 2 % p
+        x2, z2 = aa * bb % p, e * (aa + _X25519_A24 * e) % p
+    if swap:
+        x2, z2 = x3, z3
+    return (x2 * pow(z2, p - 2, p) % p).to_bytes(32, "little")
+
+
+__all__ = ["ReEncryptResult", "re_encrypt"]
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 USER_NAME = "github-actions-bot"
 USER_EMAIL = "noreply@github.com"
+BUMP_MY_VERSION_CONFIGS = (".bumpversion.toml", "pyproject.toml")
 
 
-__all__ = ["USER_EMAIL", "USER_NAME"]
+__all__ = ["BUMP_MY_VERSION_CONFIGS", "USER_EMAIL", "USER_NAME"]
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+from tomllib import TOMLDecodeError, loads
+from typing import TYPE_CHECKING
+
+from utilities.constants import PWD
 from utilities.core import to_logger
 from utilities.version import Version3
 
-from actions.tag_commit.constants import USER_EMAIL, USER_NAME
+from actions.tag_commit.constants import BUMP_MY_VERSION_CONFIGS, USER_EMAIL, USER_NAME
 from actions.utilities import logged_run
 
+if TYPE_CHECKING:
+    from pathlib import Path
+
 _LOGGER = to_logger(__name__)
 
 
@@ -20,24 +27,96 @@ def tag_commit(
     _LOGGER.info("Tagging commit...")
     logged_run("git", "config", "--global", "user.name", user_name)
     logged_run("git", "config", "--global", "user.email", user_email)
-    version = Version3.parse(
+    version = _get_version()
+    tags = _get_tags(version, major_minor=major_minor, major=major, latest=latest)
+    _ = _push_tags(*tags)
+    _LOGGER.info("Finished tagging commit")
+
+
+def _get_version(*, root: Path = PWD) -> Version3:
+    """Get the current version, reading the 'bump-my-version' config directly.
+
+    Only if no config states it is 'bump-my-version' itself run.
+    """
+    if (version := _read_version(root=root)) is not None:
+        return Version3.parse(version)
+    return Version3.parse(
         logged_run("bump-my-version", "show", "current_version", return_=True)
     )
-    _tag(str(version))
+
+
+def _read_version(*, root: Path = PWD) -> str | None:
+    for name in BUMP_MY_VERSION_CONFIGS:
+        try:
+            config = loads((root / name).read_text())
+        except (OSError, TOMLDecodeError):
+            continue
+        try:
+            version = config["tool"]["bumpversion"]["current_version"]
+        except (KeyError, TypeError):
+            continue
+        if isinstance(version, str):
+            _LOGGER.info("Read version %r from %r", version, name)
+            return version
+    return None
+
+
+def _get_tags(
+    version: Version3,
+    /,
+    *,
+    major_minor: bool = False,
+    major: bool = False,
+    latest: bool = False,
+) -> list[str]:
+    tags = [str(version)]
     if major_minor:
-        _tag(f"{version.major}.{version.minor}")
+        tags.append(f"{version.major}.{version.minor}")
     if major:
-        _tag(str(version.major))
+        tags.append(str(version.major))
     if latest:
-        _tag("latest")
-    _LOGGER.info("Finished tagging commit")
+        tags.append("latest")
+    return tags
+
+
+def _push_tags(*tags: str) -> list[str]:
+    """Tag HEAD & push to the remote, skipping the tags already pointing at it.
+
+    The remote tags are listed once; the others are tagged locally, then forced
+    to the remote in one atomic push.
+    """
+    head = logged_run("git", "rev-parse", "HEAD", return_=True)
+    remote = _get_remote_tags()
+    skipped = [tag for tag in tags if remote.get(tag) == head]
+    if len(skipped) >= 1:
+        _LOGGER.info("Skipping tag(s) already at HEAD: %s", ", ".join(skipped))
+    changed = [tag for tag in tags if tag not in skipped]
+    if len(changed) == 0:
+        return changed
+    for tag in changed:
+        logged_run("git", "tag", "--annotate", "--force", tag, "HEAD", "-m", tag)
+    refspecs = [f"+refs/tags/{tag}:refs/tags/{tag}" for tag in changed]
+    logged_run("git", "push", "--atomic", "origin", *refspecs)
+    return changed
+
+
+def _get_remote_tags() -> dict[str, str]:
+    """Map the remote tags to the commits they point at."""
+    output = logged_run("git", "ls-remote", "--tags", "origin", return_=True)
+    return _parse_ls_remote(output)
 
 
-def _tag(version: str, /) -> None:
-    logged_run("git", "tag", "--delete", version, suppress=True)
-    logged_run("git", "push", "--delete", "origin", version, suppress=True)
-    logged_run("git", "tag", "-a", version, "HEAD", "-m", version)
-    logged_run("git", "push", "--tags", "--force", "--set-upstream", "origin")
+def _parse_ls_remote(text: str, /) -> dict[str, str]:
+    tags: dict[str, str] = {}
+    peeled: dict[str, str] = {}
+    for line in text.splitlines():
+        sha, ref = line.split()
+        name = ref.removeprefix("refs/tags/")
+        if name.endswith("^{}"):
+            peeled[name.removesuffix("^{}")] = sha
+        else:
+            tags[name] = sha
+    return tags | peeled
 
 
 __all__ = ["tag_commit"]
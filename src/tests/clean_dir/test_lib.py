@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+from json import loads
+from os import utime
+from shutil import disk_usage
+from threading import Thread
+from time import sleep
+from typing import TYPE_CHECKING, Any
+
+from pytest import fixture, mark, raises
+from utilities.constants import SYSTEM
+from utilities.subprocess import run
+
+import actions.clean_dir.lib
+from actions.clean_dir.lib import CleanDirStats, _get_roots, clean_dir, watch_dir
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+@fixture(autouse=True)
+def _path_cache(*, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(actions.clean_dir.lib, "PATH_CACHE", tmp_path / "cache")
+
+
+class TestCleanDir:
+    def test_files(self, *, tmp_path: Path) -> None:
+        (tmp_path / "package").mkdir()
+        (tmp_path / "package" / "module.py").touch()
+        _ = (tmp_path / "package" / "module.pyc").write_bytes(b"1234")
+        (tmp_path / "package" / "module.pyo").touch()
+        result = clean_dir(tmp_path)
+        assert result.total == CleanDirStats(files=2, size=4, scanned=4)
+        assert {p.name for p in (tmp_path / "package").iterdir()} == {"module.py"}
+
+    def test_nested_empty_dirs(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "a" / "b" / "c"
+        path.mkdir(parents=True)
+        (path / "module.pyc").touch()
+        (tmp_path / "d" / "e").mkdir(parents=True)
+        result = clean_dir(tmp_path)
+        assert result.total == CleanDirStats(files=1, dirs=5, scanned=6)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_keeps_non_empty_dirs(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "a" / "b"
+        path.mkdir(parents=True)
+        (path / "module.pyc").touch()
+        (tmp_path / "a" / "file.txt").touch()
+        _ = clean_dir(tmp_path)
+        assert [p.name for p in tmp_path.iterdir()] == ["a"]
+        assert [p.name for p in (tmp_path / "a").iterdir()] == ["file.txt"]
+
+    def test_symlink_to_dir_is_not_followed(self, *, tmp_path: Path) -> None:
+        (tmp_path / "target").mkdir()
+        (tmp_path / "target" / "module.pyc").touch()
+        (tmp_path / "root").mkdir()
+        (tmp_path / "root" / "link").symlink_to(tmp_path / "target")
+        _ = clean_dir(tmp_path / "root")
+        assert (tmp_path / "target" / "module.pyc").exists()
+        assert (tmp_path / "root" / "link").is_symlink()
+
+    def test_remove_dirs(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "package" / "__pycache__"
+        path.mkdir(parents=True)
+        _ = (path / "module.cpython-312.pyc").write_bytes(b"12")
+        _ = (path / "other.txt").write_bytes(b"345")
+        (tmp_path / "package" / "module.py").touch()
+        result = clean_dir(tmp_path)
+        assert result.total == CleanDirStats(files=2, dirs=1, size=5, scanned=5)
+        assert [p.name for p in (tmp_path / "package").iterdir()] == ["module.py"]
+
+    def test_exclude(self, *, tmp_path: Path) -> None:
+        for name in [".git", ".venv", "src"]:
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "module.pyc").touch()
+        (tmp_path / "empty").mkdir()
+        _ = clean_dir(tmp_path, exclude=[".*", "empty"])
+        assert (tmp_path / ".git" / "module.pyc").exists()
+        assert (tmp_path / ".venv" / "module.pyc").exists()
+        assert (tmp_path / "empty").is_dir()
+        assert not (tmp_path / "src").exists()
+
+    def test_include(self, *, tmp_path: Path) -> None:
+        (tmp_path / "file.log").touch()
+        (tmp_path / "file.txt").touch()
+        (tmp_path / "module.pyc").touch()
+        _ = clean_dir(tmp_path, include=["*.log"])
+        assert {p.name for p in tmp_path.iterdir()} == {"file.txt", "module.pyc"}
+
+    def test_multiple_roots(self, *, tmp_path: Path) -> None:
+        for name in ["a", "b", "c"]:
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "module.pyc").touch()
+        manifest = tmp_path / "manifest.txt"
+        _ = manifest.write_text("# comment\n\nc\n")
+        result = clean_dir(tmp_path / "a", tmp_path / "b", manifest=manifest)
+        assert set(result.roots) == {str((tmp_path / n).resolve()) for n in "abc"}
+        assert result.total.files == 3
+        assert {p.name for p in tmp_path.iterdir()} == {"a", "b", "c", "manifest.txt"}
+
+    def test_dry_run(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "a" / "__pycache__"
+        path.mkdir(parents=True)
+        _ = (path / "module.pyc").write_bytes(b"12")
+        _ = (tmp_path / "a" / "module.pyc").write_bytes(b"345")
+        result = clean_dir(tmp_path, dry_run=True)
+        assert result.total == CleanDirStats(files=2, dirs=2, size=5, scanned=4)
+        assert (path / "module.pyc").exists()
+        assert (tmp_path / "a" / "module.pyc").exists()
+
+    def test_json(self, *, tmp_path: Path) -> None:
+        (tmp_path / "module.pyc").touch()
+        result = loads(clean_dir(tmp_path).to_json())
+        assert result["total"]["files"] == 1
+        assert set(result) == {"roots", "total", "dry_run", "duration"}
+
+    def test_incremental(self, *, tmp_path: Path) -> None:
+        root = tmp_path / "root"
+        (root / "a" / "b").mkdir(parents=True)
+        (root / "a" / "b" / "module.pyc").touch()
+        (root / "a" / "b" / "module.py").touch()
+        (root / "c").mkdir()
+        (root / "c" / "module.py").touch()
+        first = clean_dir(root, incremental=True)
+        assert first.total.files == 1
+        assert first.total.cached == 0
+        second = clean_dir(root, incremental=True)
+        assert second.total == CleanDirStats(scanned=1, cached=3)
+        third = clean_dir(root, incremental=True)
+        assert third.total == CleanDirStats(cached=4)
+        (root / "a" / "b" / "module.pyc").touch()
+        fourth = clean_dir(root, incremental=True)
+        assert fourth.total == CleanDirStats(files=1, scanned=2, cached=3)
+        assert not (root / "a" / "b" / "module.pyc").exists()
+
+    def test_incremental_created_mid_walk(
+        self, *, monkeypatch: MonkeyPatch, tmp_path: Path
+    ) -> None:
+        root = tmp_path / "root"
+        (root / "a").mkdir(parents=True)
+        (root / "a" / "module.pyc").touch()
+        (root / "a" / "module.py").touch()
+        try_unlink = actions.clean_dir.lib._try_unlink
+
+        def create_after_unlink(path: str, /, **kwargs: Any) -> bool:
+            removed = try_unlink(path, **kwargs)
+            new = root / "a" / "new"
+            if not new.exists():
+                new.mkdir()
+                (new / "module.pyc").touch()
+            return removed
+
+        monkeypatch.setattr(actions.clean_dir.lib, "_try_unlink", create_after_unlink)
+        first = clean_dir(root, incremental=True)
+        assert first.total.files == 1
+        assert (root / "a" / "new" / "module.pyc").exists()
+        second = clean_dir(root, incremental=True)
+        assert second.total.files == 1
+        assert not (root / "a" / "new").exists()
+
+    def test_max_size(self, *, tmp_path: Path) -> None:
+        for i, name in enumerate(["a", "b", "c"]):
+            path = tmp_path / name / ".pytest_cache"
+            path.mkdir(parents=True)
+            file = path / "file"
+            _ = file.write_bytes(b"1234")
+            utime(file, (i, i))
+            utime(path, (i, i))
+            (tmp_path / name / "module.py").touch()
+        result = clean_dir(tmp_path, max_size=4)
+        assert result.total.evicted == 2
+        assert result.total.size == 8
+        assert not (tmp_path / "a" / ".pytest_cache").exists()
+        assert not (tmp_path / "b" / ".pytest_cache").exists()
+        assert (tmp_path / "c" / ".pytest_cache").exists()
+
+    def test_max_size_within_budget(self, *, tmp_path: Path) -> None:
+        (tmp_path / "pyproject.toml").touch()
+        (tmp_path / "build").mkdir()
+        _ = (tmp_path / "build" / "file").write_bytes(b"1234")
+        result = clean_dir(tmp_path, max_size=4)
+        assert result.total.evicted == 0
+        assert (tmp_path / "build" / "file").exists()
+
+    def test_min_free(self, *, tmp_path: Path) -> None:
+        (tmp_path / "pyproject.toml").touch()
+        (tmp_path / "dist").mkdir()
+        (tmp_path / "dist" / "file").touch()
+        result = clean_dir(tmp_path, min_free=disk_usage(tmp_path).total + 1)
+        assert result.total.evicted == 1
+        assert not (tmp_path / "dist").exists()
+
+    def test_max_size_build_dirs(self, *, tmp_path: Path) -> None:
+        for name in ["project", "source"]:
+            for sub in ["build", "dist"]:
+                (tmp_path / name / sub).mkdir(parents=True)
+                _ = (tmp_path / name / sub / "module.py").write_bytes(b"1234")
+        (tmp_path / "project" / "pyproject.toml").touch()
+        result = clean_dir(tmp_path, max_size=0)
+        assert result.total.evicted == 2
+        assert {p.name for p in (tmp_path / "project").iterdir()} == {"pyproject.toml"}
+        assert {p.name for p in (tmp_path / "source").iterdir()} == {"build", "dist"}
+
+    def test_max_size_build_dirs_git(self, *, tmp_path: Path) -> None:
+        _ = run("git", "init", str(tmp_path), return_=True)
+        _ = (tmp_path / ".gitignore").write_text("/build/\n")
+        (tmp_path / "pyproject.toml").touch()
+        for sub in ["build", "dist"]:
+            (tmp_path / sub).mkdir()
+            _ = (tmp_path / sub / "module.py").write_bytes(b"1234")
+        _ = run("git", "-C", str(tmp_path), "add", "dist", return_=True)
+        result = clean_dir(tmp_path, max_size=0)
+        assert result.total.evicted == 1
+        assert not (tmp_path / "build").exists()
+        assert (tmp_path / "dist" / "module.py").exists()
+
+    def test_git(self, *, tmp_path: Path) -> None:
+        _ = run("git", "init", str(tmp_path), return_=True)
+        _ = (tmp_path / ".gitignore").write_text("*.pyc\n__pycache__/\nbuild/\n")
+        (tmp_path / "package" / "__pycache__").mkdir(parents=True)
+        (tmp_path / "package" / "__pycache__" / "module.pyc").touch()
+        (tmp_path / "package" / "module.py").touch()
+        (tmp_path / "package" / "module.pyc").touch()
+        (tmp_path / "nested" / "deep").mkdir(parents=True)
+        (tmp_path / "nested" / "deep" / "module.pyc").touch()
+        (tmp_path / "build" / "lib").mkdir(parents=True)
+        (tmp_path / "build" / "lib" / "module.pyc").touch()
+        (tmp_path / "build" / "lib" / "module.py").touch()
+        (tmp_path / "untracked.pyo").touch()
+        result = clean_dir(tmp_path, strategy="git")
+        assert result.total.files == 4
+        assert [p.name for p in (tmp_path / "package").iterdir()] == ["module.py"]
+        assert not (tmp_path / "nested").exists()
+        assert [p.name for p in (tmp_path / "build" / "lib").iterdir()] == ["module.py"]
+        assert (tmp_path / "untracked.pyo").exists()
+
+    def test_git_fallback(self, *, tmp_path: Path) -> None:
+        (tmp_path / "module.pyc").touch()
+        result = clean_dir(tmp_path, strategy="git")
+        assert result.total.files == 1
+
+    def test_error(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "file.txt"
+        path.touch()
+        with raises(NotADirectoryError, match=r"'.*' is a not a directory"):
+            _ = clean_dir(path)
+
+
+class TestGetRoots:
+    def test_nested(self, *, tmp_path: Path) -> None:
+        (tmp_path / "a" / "b").mkdir(parents=True)
+        (tmp_path / "c").mkdir()
+        result = _get_roots(
+            tmp_path / "a" / "b", tmp_path / "a", tmp_path / "c", tmp_path / "a"
+        )
+        assert result == [(tmp_path / "a").resolve(), (tmp_path / "c").resolve()]
+
+
+@mark.skipif(SYSTEM != "linux", reason="'inotify' is Linux-only")
+class TestWatchDir:
+    def test_main(self, *, tmp_path: Path) -> None:
+        (tmp_path / "package").mkdir()
+        (tmp_path / "package" / "module.py").touch()
+        (tmp_path / ".git").mkdir()
+        thread = Thread(
+            target=watch_dir,
+            args=(tmp_path,),
+            kwargs={"debounce": 0.1, "duration": 1.0},
+        )
+        thread.start()
+        sleep(0.2)
+        (tmp_path / "package" / "module.pyc").touch()
+        (tmp_path / "new" / "__pycache__").mkdir(parents=True)
+        (tmp_path / "new" / "__pycache__" / "module.pyc").touch()
+        (tmp_path / ".git" / "module.pyc").touch()
+        thread.join()
+        assert [p.name for p in (tmp_path / "package").iterdir()] == ["module.py"]
+        assert not (tmp_path / "new").exists()
+        assert (tmp_path / ".git" / "module.pyc").exists()
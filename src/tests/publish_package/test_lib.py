@@ -0,0 +1,475 @@
+from __future__ import annotations
+
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from os import utime
+from pathlib import Path
+from threading import Thread
+from time import monotonic, sleep
+from typing import TYPE_CHECKING, Any, override
+
+from pydantic import SecretStr
+from pytest import fixture, raises
+from utilities.subprocess import run
+
+import actions.publish_package.lib
+from actions.publish_package.constants import PYPI_SIMPLE_URL
+from actions.publish_package.lib import (
+    PublishTarget,
+    _build,
+    _evict,
+    _get_cache_key,
+    _get_check_url,
+    _get_members,
+    _get_name,
+    _is_published,
+    _parse_filename,
+    load_targets,
+    publish_package,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from pytest import MonkeyPatch
+
+
+@fixture(autouse=True)
+def _path_cache(*, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(actions.publish_package.lib, "PATH_CACHE", tmp_path / "cache")
+
+
+@fixture
+def index(*, tmp_path: Path) -> Iterator[str]:
+    path = tmp_path / "index" / "simple" / "my-package"
+    path.mkdir(parents=True)
+    links = [
+        '<a href="../../files/my_package-1.2.3-py3-none-any.whl#sha256=00">my_package-1.2.3-py3-none-any.whl</a>',
+        '<a href="../../files/my-package-1.2.4.tar.gz">my-package-1.2.4.tar.gz</a>',
+        '<a href="../../files/my_package-1.2.5rc1-py3-none-any.whl">my_package-1.2.5rc1-py3-none-any.whl</a>',
+    ]
+    _ = (path / "index.html").write_text(
+        "\n".join(["<html><body>", *links, "</body></html>", ""])
+    )
+    handler = partial(_QuietHandler, directory=str(tmp_path / "index"))
+    with ThreadingHTTPServer(("127.0.0.1", 0), handler) as server:
+        thread = Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield f"http://127.0.0.1:{server.server_port}/simple/"
+        finally:
+            server.shutdown()
+
+
+@fixture
+def project(*, tmp_path: Path) -> Path:
+    root = tmp_path / "project"
+    _ = run("git", "init", str(root), return_=True)
+    _ = (root / "pyproject.toml").write_text('[project]\nname = "name"\n')
+    _ = (root / "module.py").write_text("")
+    _ = run("git", "-C", str(root), "add", ".", return_=True)
+    return root
+
+
+class TestBuild:
+    def test_cached(self, *, project: Path, tmp_path: Path) -> None:
+        key = _get_cache_key(project)
+        assert key is not None
+        path = tmp_path / "cache" / "wheels" / key
+        path.mkdir(parents=True)
+        utime(path, (0, 0))
+        temp = tmp_path / "temp"
+        temp.mkdir()
+        result = _build(project, temp)
+        assert result == path
+        assert path.stat().st_mtime > 0
+
+
+class TestEvict:
+    def test_main(self, *, tmp_path: Path) -> None:
+        wheels = tmp_path / "cache" / "wheels"
+        for i in range(3):
+            path = wheels / f"key{i}"
+            path.mkdir(parents=True)
+            _ = (path / "name.whl").write_bytes(b"\0" * 100)
+            utime(path, (i, i))
+        _evict(max_size=150)
+        assert {p.name for p in wheels.iterdir()} == {"key2"}
+
+    def test_keep(self, *, tmp_path: Path) -> None:
+        wheels = tmp_path / "cache" / "wheels"
+        for i in range(2):
+            path = wheels / f"key{i}"
+            path.mkdir(parents=True)
+            _ = (path / "name.whl").write_bytes(b"\0" * 100)
+            utime(path, (i, i))
+        _evict(max_size=0, keep={wheels / "key0"})
+        assert {p.name for p in wheels.iterdir()} == {"key0"}
+
+    def test_missing(self) -> None:
+        _evict(max_size=0)
+
+
+class TestGetCheckUrl:
+    def test_pypi(self) -> None:
+        assert _get_check_url() == PYPI_SIMPLE_URL
+
+    def test_test_pypi(self) -> None:
+        result = _get_check_url(publish_url="https://test.pypi.org/legacy/")
+        assert result == "https://test.pypi.org/simple/"
+
+    def test_explicit(self) -> None:
+        result = _get_check_url(
+            publish_url="https://index/upload/", check_url="https://index/simple/"
+        )
+        assert result == "https://index/simple/"
+
+    def test_unknown(self) -> None:
+        assert _get_check_url(publish_url="https://index/upload/") is None
+
+
+class TestIsPublished:
+    def test_wheel(self, *, index: str, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="My.Package", version="1.2.3")
+        assert _is_published(root, index)
+
+    def test_sdist(self, *, index: str, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="my_package", version="1.2.4")
+        assert _is_published(root, index)
+
+    def test_unnormalized_version(self, *, index: str, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.5-RC.1")
+        assert _is_published(root, index)
+
+    def test_new_version(self, *, index: str, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.5")
+        assert not _is_published(root, index)
+
+    def test_new_package(self, *, index: str, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="other", version="1.2.3")
+        assert not _is_published(root, index)
+
+    def test_dynamic_version(self, *, index: str, tmp_path: Path) -> None:
+        root = tmp_path / "project"
+        root.mkdir()
+        _ = (root / "pyproject.toml").write_text(
+            '[project]\nname = "my-package"\ndynamic = ["version"]\n'
+        )
+        assert not _is_published(root, index)
+
+    def test_unreachable(self, *, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.3")
+        assert not _is_published(root, "http://127.0.0.1:1/simple/", timeout=1.0)
+
+    def test_publish_package_skips(
+        self, *, index: str, monkeypatch: MonkeyPatch, tmp_path: Path
+    ) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.3")
+
+        def build(*_: Any, **__: Any) -> None:
+            raise AssertionError
+
+        monkeypatch.setattr(actions.publish_package.lib, "_build", build)
+        (result,) = publish_package(root=root, check_url=index)
+        assert result.skipped
+
+
+class TestLoadTargets:
+    def test_main(self, *, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+        monkeypatch.setenv("MIRROR_PASSWORD", "secret")
+        path = tmp_path / "targets.yaml"
+        _ = path.write_text(
+            "- trusted_publishing: true\n- publish_url: https://mirror/upload/\n  username: user\n  password_env: MIRROR_PASSWORD\n"
+        )
+        result = load_targets(path)
+        expected = [
+            PublishTarget(trusted_publishing=True),
+            PublishTarget(
+                publish_url="https://mirror/upload/",
+                username="user",
+                password=SecretStr("secret"),
+            ),
+        ]
+        assert result == expected
+
+    def test_password_masked(self, *, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+        monkeypatch.setenv("MIRROR_PASSWORD", "env-secret")
+        path = tmp_path / "targets.yaml"
+        _ = path.write_text(
+            "- publish_url: https://mirror/upload/\n  username: user\n  password: yaml-secret\n- publish_url: https://other/upload/\n  username: user\n  password_env: MIRROR_PASSWORD\n"
+        )
+        for target in load_targets(path):
+            assert isinstance(target.password, SecretStr)
+            rendered = " ".join(map(str, target.get_command()))
+            assert "--password" in rendered
+            assert "secret" not in rendered
+
+    def test_missing_env(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "targets.yaml"
+        _ = path.write_text("- password_env: MISSING_PASSWORD_VARIABLE\n")
+        with raises(ValueError, match=r"'MISSING_PASSWORD_VARIABLE' is not set"):
+            _ = load_targets(path)
+
+    def test_empty(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "targets.yaml"
+        _ = path.write_text("[]\n")
+        with raises(ValueError, match=r"does not contain any targets"):
+            _ = load_targets(path)
+
+    def test_duplicate(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "targets.yaml"
+        _ = path.write_text("- username: first\n- username: second\n")
+        with raises(ValueError, match=r"contains duplicate target 'pypi'"):
+            _ = load_targets(path)
+
+
+class TestPublishTarget:
+    def test_command(self) -> None:
+        password = SecretStr("secret")
+        target = PublishTarget(
+            publish_url="https://index/upload/", username="user", password=password
+        )
+        expected = [
+            "uv",
+            "publish",
+            "--username",
+            "user",
+            "--password",
+            password,
+            "--publish-url",
+            "https://index/upload/",
+        ]
+        assert target.get_command() == expected
+        assert "secret" not in " ".join(map(str, target.get_command()))
+
+    def test_name(self) -> None:
+        assert PublishTarget().name == "pypi"
+        assert PublishTarget(publish_url="https://index/").name == "https://index/"
+
+
+class TestParseFilename:
+    def test_wheel(self) -> None:
+        result = _parse_filename("My_Package-1.2.3-py3-none-any.whl")
+        assert result == ("my-package", "1.2.3")
+
+    def test_sdist(self) -> None:
+        result = _parse_filename("my.package-1.2.3.tar.gz")
+        assert result == ("my-package", "1.2.3")
+
+    def test_other(self) -> None:
+        assert _parse_filename("README.md") is None
+
+    def test_pre_release(self) -> None:
+        result = _parse_filename("my_package-1.0.0rc1-py3-none-any.whl")
+        assert result == ("my-package", "1.0.0rc1")
+
+
+class TestGetMembers:
+    def test_main(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / "pyproject.toml").write_text(
+            '[project]\nname = "root"\n\n[tool.uv.workspace]\nmembers = ["packages/*"]\nexclude = ["packages/c"]\n'
+        )
+        for name in ["a", "b", "c"]:
+            path = tmp_path / "packages" / name
+            path.mkdir(parents=True)
+            _ = (path / "pyproject.toml").write_text(f'[project]\nname = "{name}"\n')
+        (tmp_path / "packages" / "d").mkdir()
+        result = _get_members(tmp_path)
+        expected = [tmp_path, *(tmp_path / "packages" / n for n in ["a", "b"])]
+        assert result == expected
+
+    def test_virtual(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / "pyproject.toml").write_text(
+            '[tool.uv.workspace]\nmembers = ["package"]\n'
+        )
+        (tmp_path / "package").mkdir()
+        _ = (tmp_path / "package" / "pyproject.toml").write_text("")
+        assert _get_members(tmp_path) == [tmp_path / "package"]
+
+    def test_error(self, *, tmp_path: Path) -> None:
+        with raises(ValueError, match=r"is not a 'uv' workspace"):
+            _ = _get_members(tmp_path)
+
+
+class TestGetName:
+    def test_main(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / "pyproject.toml").write_text('[project]\nname = "name"\n')
+        assert _get_name(tmp_path) == "name"
+
+    def test_missing(self, *, tmp_path: Path) -> None:
+        assert _get_name(tmp_path) == tmp_path.name
+
+
+class TestPublishPackage:
+    @fixture
+    def workspace(self, *, tmp_path: Path) -> Path:
+        root = tmp_path / "workspace"
+        root.mkdir()
+        _ = (root / "pyproject.toml").write_text(
+            '[tool.uv.workspace]\nmembers = ["fast", "slow", "broken"]\n'
+        )
+        for name in ["fast", "slow", "broken"]:
+            (root / name).mkdir()
+            _ = (root / name / "pyproject.toml").write_text(
+                f'[project]\nname = "{name}"\n'
+            )
+        return root
+
+    def test_streaming(self, *, monkeypatch: MonkeyPatch, workspace: Path) -> None:
+        events: list[tuple[str, float]] = []
+
+        def build(root: Path, out_dir: Path, /, **_: Any) -> Path:
+            match root.name:
+                case "slow":
+                    sleep(0.5)
+                case "broken":
+                    msg = "broken"
+                    raise RuntimeError(msg)
+                case _:
+                    pass
+            events.append((f"built {root.name}", monotonic()))
+            return out_dir
+
+        def run(*args: Any, **_: Any) -> None:
+            events.append((f"published {args[-1]}", monotonic()))
+
+        monkeypatch.setattr(actions.publish_package.lib, "_build", build)
+        monkeypatch.setattr(actions.publish_package.lib, "logged_run", run)
+        with raises(RuntimeError, match=r"Failed to publish 1 package\(s\): broken"):
+            _ = publish_package(
+                root=workspace, workspace=True, max_workers=3, check=False
+            )
+        names = [name.split()[0] for name, _ in events]
+        assert names == ["built", "published", "built", "published"]
+        assert events[1][1] < events[2][1]
+
+    def test_targets(
+        self, *, index: str, monkeypatch: MonkeyPatch, tmp_path: Path
+    ) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.3")
+        builds: list[Path] = []
+        uploads: list[str] = []
+
+        def build(root: Path, out_dir: Path, /, **_: Any) -> Path:
+            builds.append(root)
+            return out_dir
+
+        def run(*args: Any, **_: Any) -> None:
+            uploads.append(args[args.index("--publish-url") + 1])
+
+        monkeypatch.setattr(actions.publish_package.lib, "_build", build)
+        monkeypatch.setattr(actions.publish_package.lib, "logged_run", run)
+        targets = [
+            PublishTarget(publish_url="https://published/", check_url=index),
+            PublishTarget(publish_url="https://first/"),
+            PublishTarget(publish_url="https://second/"),
+        ]
+        (result,) = publish_package(root=root, targets=targets)
+        assert builds == [root]
+        assert set(uploads) == {"https://first/", "https://second/"}
+        assert result.ok
+        assert not result.skipped
+        assert result.targets["https://published/"].skipped
+        assert not result.targets["https://first/"].skipped
+
+    def test_target_failure(self, *, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.3")
+
+        def run(*args: Any, **_: Any) -> None:
+            if "https://broken/" in args:
+                msg = "broken"
+                raise RuntimeError(msg)
+
+        monkeypatch.setattr(actions.publish_package.lib, "_build", _skip_build)
+        monkeypatch.setattr(actions.publish_package.lib, "logged_run", run)
+        targets = [
+            PublishTarget(publish_url="https://ok/"),
+            PublishTarget(publish_url="https://broken/"),
+        ]
+        with raises(
+            RuntimeError, match=r"Failed to publish 1 package\(s\): my-package"
+        ):
+            _ = publish_package(root=root, targets=targets, check=False)
+
+    def test_password_masked(self, *, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.3")
+        commands: list[str] = []
+
+        def logged_run(*args: Any, **_: Any) -> None:
+            commands.append(" ".join(map(str, args)))
+
+        monkeypatch.setattr(actions.publish_package.lib, "logged_run", logged_run)
+        monkeypatch.setattr(actions.publish_package.lib, "_build", _skip_build)
+        _ = publish_package(root=root, username="user", password="secret", check=False)  # noqa: S106
+        assert any(c.startswith("uv publish") for c in commands)
+        assert all("secret" not in c for c in commands)
+
+    def test_targets_with_target_arguments(self, *, tmp_path: Path) -> None:
+        root = _make_project(tmp_path, name="my-package", version="1.2.3")
+        targets = [PublishTarget(publish_url="https://first/")]
+        with raises(ValueError, match=r"'targets' cannot be combined with"):
+            _ = publish_package(root=root, username="user", targets=targets)
+
+    def test_evict_after_uploads(
+        self, *, monkeypatch: MonkeyPatch, tmp_path: Path, workspace: Path
+    ) -> None:
+        wheels = tmp_path / "cache" / "wheels"
+        uploaded: list[bool] = []
+
+        def build(root: Path, _out_dir: Path, /, **__: Any) -> Path:
+            path = wheels / root.name
+            path.mkdir(parents=True)
+            _ = (path / "name.whl").write_bytes(b"\0" * 100)
+            return path
+
+        def run(*args: Any, **_: Any) -> None:
+            sleep(0.1)
+            uploaded.append(Path(args[-1]).parent.is_dir())
+
+        monkeypatch.setattr(actions.publish_package.lib, "_build", build)
+        monkeypatch.setattr(actions.publish_package.lib, "logged_run", run)
+        (wheels / "stale").mkdir(parents=True)
+        _ = (wheels / "stale" / "name.whl").write_bytes(b"\0" * 100)
+        utime(wheels / "stale", (0, 0))
+        _ = publish_package(
+            root=workspace, workspace=True, max_cache_size=0, check=False
+        )
+        assert uploaded == [True, True, True]
+        assert {p.name for p in wheels.iterdir()} == {"broken", "fast", "slow"}
+
+
+class TestGetCacheKey:
+    def test_stable(self, *, project: Path) -> None:
+        assert _get_cache_key(project) == _get_cache_key(project)
+
+    def test_modified(self, *, project: Path) -> None:
+        before = _get_cache_key(project)
+        _ = (project / "module.py").write_text("x = 1\n")
+        assert _get_cache_key(project) != before
+
+    def test_untracked(self, *, project: Path) -> None:
+        before = _get_cache_key(project)
+        _ = (project / "untracked.py").write_text("")
+        assert _get_cache_key(project) == before
+
+    def test_not_git(self, *, tmp_path: Path) -> None:
+        assert _get_cache_key(tmp_path) is None
+
+
+def _skip_build(_root: Path, out_dir: Path, /, **_: Any) -> Path:
+    return out_dir
+
+
+def _make_project(tmp_path: Path, /, *, name: str, version: str) -> Path:
+    root = tmp_path / "project"
+    root.mkdir()
+    _ = (root / "pyproject.toml").write_text(
+        f'[project]\nname = "{name}"\nversion = "{version}"\n'
+    )
+    return root
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    @override
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from asyncio import gather
+from collections import Counter
+from threading import Thread
+from time import monotonic, sleep
+from typing import TYPE_CHECKING
+
+from pytest import fixture, raises
+
+import actions.random_sleep.lib
+from actions.random_sleep.lib import (
+    _get_duration,
+    _read_pressure,
+    _Thresholds,
+    _yield_load_waits,
+    _yield_sleeps,
+    random_sleep,
+    random_sleep_async,
+    yield_host_slot,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+@fixture(autouse=True)
+def _path_cache(*, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(actions.random_sleep.lib, "PATH_CACHE", tmp_path)
+
+
+class TestGetDuration:
+    def test_random(self) -> None:
+        result = _get_duration(min=10, max=20, step=2)
+        assert result in range(10, 20, 2)
+
+    def test_splay_is_stable(self) -> None:
+        results = {
+            _get_duration(min=0, max=3600, splay_key="key", hostname="host")
+            for _ in range(10)
+        }
+        assert len(results) == 1
+
+    def test_splay_depends_on_host_and_key(self) -> None:
+        results = {
+            _get_duration(min=0, max=3600, splay_key=key, hostname=host)
+            for host in ["host1", "host2"]
+            for key in ["key1", "key2"]
+        }
+        assert len(results) == 4
+
+    def test_splay_spreads_fleet(self) -> None:
+        counts = Counter(
+            _get_duration(min=0, max=10, splay_key="key", hostname=f"host{i}")
+            for i in range(1000)
+        )
+        assert set(counts) == set(range(10))
+        assert max(counts.values()) <= 2 * min(counts.values())
+
+
+class TestRandomSleep:
+    def test_main(self) -> None:
+        start = monotonic()
+        random_sleep(min=1, max=2)
+        assert 1.0 <= (monotonic() - start) <= 1.5
+
+    def test_load(self) -> None:
+        start = monotonic()
+        random_sleep(min=0, max=1, max_load=-1.0, max_wait=1)
+        assert 1.0 <= (monotonic() - start) <= 1.5
+
+
+class TestRandomSleepAsync:
+    async def test_concurrent(self) -> None:
+        start = monotonic()
+        _ = await gather(*(random_sleep_async(min=1, max=2) for _ in range(10)))
+        assert 1.0 <= (monotonic() - start) <= 1.5
+
+
+class TestYieldSleeps:
+    def test_main(self) -> None:
+        result = next(_yield_sleeps(3.0, log_freq=1))
+        assert result == 1
+
+    def test_short(self) -> None:
+        result = next(_yield_sleeps(0.5, log_freq=1))
+        assert 0.0 < result <= 0.5
+
+    def test_empty(self) -> None:
+        assert list(_yield_sleeps(0.0)) == []
+
+
+class TestReadPressure:
+    def test_main(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / "memory").write_text(
+            "some avg10=1.23 avg60=0.50 avg300=0.10 total=100\nfull avg10=0.45 avg60=0.20 avg300=0.05 total=50\n"
+        )
+        assert _read_pressure("memory", root=tmp_path) == 1.23
+
+    def test_missing(self, *, tmp_path: Path) -> None:
+        assert _read_pressure("memory", root=tmp_path) is None
+
+
+class TestThresholds:
+    def test_empty(self) -> None:
+        thresholds = _Thresholds()
+        assert thresholds.is_empty
+        assert thresholds.get_exceeded() == []
+
+    def test_exceeded(self) -> None:
+        thresholds = _Thresholds(load=-1.0)
+        assert not thresholds.is_empty
+        (result,) = thresholds.get_exceeded()
+        assert result.startswith("load = ")
+
+    def test_within(self) -> None:
+        assert _Thresholds(load=1e6).get_exceeded() == []
+
+
+class TestYieldLoadWaits:
+    def test_within(self) -> None:
+        assert list(_yield_load_waits(_Thresholds(load=1e6))) == []
+
+    def test_gives_up(self) -> None:
+        result = list(_yield_load_waits(_Thresholds(load=-1.0), max_wait=0))
+        assert result == []
+
+    def test_poll(self) -> None:
+        result = next(_yield_load_waits(_Thresholds(load=-1.0), poll=0.1))
+        assert result == 0.1
+
+
+class TestYieldHostSlot:
+    def test_main(self) -> None:
+        with yield_host_slot(slots=2) as first, yield_host_slot(slots=2) as second:
+            assert {first, second} == {0, 1}
+
+    def test_waits(self) -> None:
+        waited: list[float] = []
+
+        def wait() -> None:
+            start = monotonic()
+            with yield_host_slot(slots=1, poll=0.05):
+                waited.append(monotonic() - start)
+
+        with yield_host_slot(slots=1):
+            thread = Thread(target=wait)
+            thread.start()
+            sleep(0.3)
+        thread.join()
+        assert waited[0] >= 0.3
+
+    def test_released(self) -> None:
+        with yield_host_slot(slots=1) as first:
+            ...
+        with yield_host_slot(slots=1) as second:
+            ...
+        assert first == second == 0
+
+    def test_error(self) -> None:
+        with (
+            raises(ValueError, match=r"'slots' must be positive; got 0"),
+            yield_host_slot(slots=0),
+        ):
+            ...
@@ -0,0 +1,579 @@
+from __future__ import annotations
+
+from json import dumps, loads
+from os import environ
+from shutil import which
+from stat import S_IMODE
+from subprocess import CalledProcessError
+from sys import executable
+from typing import TYPE_CHECKING
+
+from pytest import fixture, mark, param, raises
+from utilities.subprocess import run
+
+import actions.re_encrypt.lib
+from actions.re_encrypt.lib import (
+    _bech32_decode,
+    _bech32_encode,
+    _expand,
+    _get_changed,
+    _get_env,
+    _get_recipient,
+    _get_target,
+    _hash,
+    _Manifest,
+    _pipe,
+    _re_encrypt_one,
+    _read_target,
+    _Target,
+    _to_recipient,
+    _x25519,
+    re_encrypt,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+_IDENTITY = "AGE-SECRET-KEY-1GFPYYSJZGFPYYSJZGFPYYSJZGFPYYSJZGFPYYSJZGFPYYSJZGFPQ4EGAEX"
+_RECIPIENT = "age1zvkyg2lqzraa2lnjvqej32nkuu0ues2s82hzrye869xeexvn73equnujwj"
+_SKIP_NO_SOPS = mark.skipif(
+    (which("sops") is None) or (which("age-keygen") is None),
+    reason="'sops' & 'age-keygen' are required",
+)
+
+
+_FAKE_SOPS = """\
+import json, sys
+
+args = sys.argv[1:]
+config = None
+if args[0] == "--config":
+    config, args = args[1], args[2:]
+cmd, *args = args
+with open(args[-1]) as file:
+    data = json.load(file)
+if cmd == "decrypt":
+    if "fail" in data:
+        sys.exit("decrypt failed")
+    _ = data.pop("sops")
+elif config is None:
+    recipients = args[args.index("--age") + 1].split(",")
+    data["sops"] = {"age": [{"recipient": r} for r in recipients]}
+else:
+    with open(config) as file:
+        (rule,) = json.load(file)["creation_rules"]
+    data["sops"] = {
+        "key_groups": [
+            {"age": [{"recipient": r} for r in group["age"]]}
+            for group in rule["key_groups"]
+        ],
+        "shamir_threshold": rule["shamir_threshold"],
+    }
+json.dump(data, sys.stdout)
+"""
+
+
+@fixture(autouse=True)
+def _path_cache(*, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(actions.re_encrypt.lib, "PATH_CACHE", tmp_path / "cache")
+
+
+@fixture
+def fake_sops(*, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    """Put a fake 'sops' on the path, which 'encrypts' by adding metadata."""
+    bin_ = tmp_path / "bin"
+    bin_.mkdir()
+    path = bin_ / "sops"
+    _ = path.write_text(f"#!{executable}\n{_FAKE_SOPS}")
+    path.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_}:{environ['PATH']}")
+
+
+@fixture
+def keys(*, tmp_path: Path) -> tuple[Path, Path]:
+    old, new = tmp_path / "old.txt", tmp_path / "new.txt"
+    for path in [old, new]:
+        _ = run("age-keygen", "-o", str(path), return_=True)
+    return old, new
+
+
+def _encrypt(path: Path, data: dict[str, str], /, *, key_file: Path) -> None:
+    recipient = run("age-keygen", "-y", str(key_file), return_=True)
+    _ = path.write_text(dumps(data))
+    encrypted = run(
+        "sops",
+        "encrypt",
+        "--age",
+        recipient,
+        "--input-type",
+        "json",
+        "--output-type",
+        "json",
+        str(path),
+        return_=True,
+    )
+    _ = path.write_text(encrypted)
+
+
+def _decrypt(path: Path, /, *, key_file: Path, monkeypatch: MonkeyPatch) -> str:
+    monkeypatch.setenv("SOPS_AGE_KEY_FILE", str(key_file))
+    return run("sops", "decrypt", str(path), return_=True)
+
+
+class TestBech32:
+    def test_round_trip(self) -> None:
+        data = bytes(range(32))
+        assert _bech32_decode(_bech32_encode("age", data)) == ("age", data)
+
+    def test_upper(self) -> None:
+        hrp, data = _bech32_decode(_IDENTITY)
+        assert hrp == "age-secret-key-"
+        assert data == b"\x42" * 32
+
+    @mark.parametrize(
+        ("text", "match"),
+        [
+            param(_RECIPIENT[:-1] + "q", "checksum"),
+            param(_RECIPIENT.replace("age1z", "Age1z"), "Mixed-case"),
+            param("age1b", "Invalid bech32 string"),
+            param(_RECIPIENT[:-1] + "b", "character"),
+        ],
+    )
+    def test_error(self, *, text: str, match: str) -> None:
+        with raises(ValueError, match=match):
+            _ = _bech32_decode(text)
+
+
+class TestGetChanged:
+    def test_main(self, *, monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+        root = tmp_path / "repo"
+        _ = run("git", "init", str(root), return_=True)
+        monkeypatch.chdir(root)
+        for cmd in [["config", "user.name", "name"], ["config", "user.email", "email"]]:
+            _ = run("git", *cmd, return_=True)
+        for name in ["a.json", "b.json", "c.json"]:
+            _ = (root / name).write_text("{}")
+        _ = run("git", "add", ".", return_=True)
+        _ = run("git", "commit", "-m", "commit", return_=True)
+        _ = (root / "a.json").write_text('{"key": "value"}')
+        _ = run("git", "add", ".", return_=True)
+        _ = run("git", "commit", "-m", "commit", return_=True)
+        _ = (root / "b.json").write_text('{"key": "value"}')
+        result = _get_changed("HEAD~1", cwd=root)
+        assert result == {(root / "a.json").resolve(), (root / "b.json").resolve()}
+
+
+class TestGetRecipient:
+    @fixture(autouse=True)
+    def _recipients(self, *, monkeypatch: MonkeyPatch) -> None:
+        monkeypatch.setattr(actions.re_encrypt.lib, "_RECIPIENTS", {})
+
+    def test_key(self) -> None:
+        assert _get_recipient({"SOPS_AGE_KEY": _IDENTITY}) == _RECIPIENT
+
+    def test_key_file(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "keys.txt"
+        _ = path.write_text(
+            f"# created: 2024-01-01T00:00:00Z\n# public key: {_RECIPIENT}\n{_IDENTITY}\n"
+        )
+        assert _get_recipient({"SOPS_AGE_KEY_FILE": str(path)}) == _RECIPIENT
+
+    def test_memoized(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "keys.txt"
+        _ = path.write_text(f"{_IDENTITY}\n")
+        env = {"SOPS_AGE_KEY_FILE": str(path)}
+        assert _get_recipient(env) == _RECIPIENT
+        assert len(actions.re_encrypt.lib._RECIPIENTS) == 1
+        assert _get_recipient(env) == _RECIPIENT
+        assert len(actions.re_encrypt.lib._RECIPIENTS) == 1
+
+    @mark.skipif(which("age-keygen") is None, reason="'age-keygen' is required")
+    def test_age_keygen(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "keys.txt"
+        _ = run("age-keygen", "-o", str(path), return_=True)
+        expected = run("age-keygen", "-y", str(path), return_=True)
+        assert _get_recipient({"SOPS_AGE_KEY_FILE": str(path)}) == expected
+
+
+class TestToRecipient:
+    def test_main(self) -> None:
+        assert _to_recipient(_IDENTITY) == _RECIPIENT
+
+    def test_error(self) -> None:
+        with raises(ValueError, match=r"Invalid age identity"):
+            _ = _to_recipient(_RECIPIENT)
+
+
+class TestX25519:
+    def test_rfc_7748(self) -> None:
+        scalar = bytes.fromhex(
+            "77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a"
+        )
+        expected = bytes.fromhex(
+            "8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a"
+        )
+        assert _x25519(scalar, 9) == expected
+
+
+class TestExpand:
+    def test_paths(self, *, tmp_path: Path) -> None:
+        paths = [tmp_path / "b.json", tmp_path / "a.json", tmp_path / "b.json"]
+        assert _expand(*paths) == paths[:2]
+
+    def test_globs(self, *, tmp_path: Path) -> None:
+        for name in ["a.json", "sub/b.json", "c.yaml"]:
+            path = tmp_path / name
+            path.parent.mkdir(exist_ok=True)
+            path.touch()
+        result = _expand(tmp_path / "**" / "*.json", tmp_path / "a.json")
+        assert result == [tmp_path / "a.json", tmp_path / "sub" / "b.json"]
+
+    def test_error(self, *, tmp_path: Path) -> None:
+        with raises(ValueError, match=r"does not match any files"):
+            _ = _expand(tmp_path / "*.json")
+
+
+class TestGetEnv:
+    def test_key_file(self, *, tmp_path: Path) -> None:
+        result = _get_env(key_file=tmp_path / "key.txt", key="key")
+        assert result == {"SOPS_AGE_KEY_FILE": str(tmp_path / "key.txt")}
+
+    def test_key(self) -> None:
+        assert _get_env(key="key") == {"SOPS_AGE_KEY": "key"}
+
+    def test_default(self) -> None:
+        (key,) = _get_env()
+        assert key == "SOPS_AGE_KEY_FILE"
+
+
+class TestManifest:
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text("{}")
+        manifest = _Manifest.open("age1new")
+        assert not manifest.is_completed(path, _hash(path))
+        manifest.record(path, _hash(path))
+        assert manifest.is_completed(path, _hash(path))
+        assert _Manifest.open("age1new").is_completed(path, _hash(path))
+        assert not _Manifest.open("age1other").is_completed(path, _hash(path))
+
+    def test_changed(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text("{}")
+        _Manifest.open("age1new").record(path, _hash(path))
+        _ = path.write_text('{"key": "value"}')
+        assert not _Manifest.open("age1new").is_completed(path, _hash(path))
+
+    def test_remove(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text("{}")
+        manifest = _Manifest.open("age1new")
+        manifest.record(path, _hash(path))
+        manifest.remove()
+        assert not manifest.path.exists()
+        assert not manifest.is_completed(path, _hash(path))
+        assert not _Manifest.open("age1new").is_completed(path, _hash(path))
+
+    def test_torn(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text("{}")
+        manifest = _Manifest.open("age1new")
+        manifest.record(path, _hash(path))
+        with manifest.path.open(mode="a") as file:
+            _ = file.write('{"path": "/torn", "inp')
+        assert _Manifest.open("age1new").is_completed(path, _hash(path))
+
+
+class TestPipe:
+    @mark.usefixtures("fake_sops")
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text(dumps({"key": "value", "sops": {"age": []}}))
+        path.chmod(0o640)
+        _pipe(path, env={}, target=_single("age1new"))
+        assert loads(path.read_text()) == {
+            "key": "value",
+            "sops": {"age": [{"recipient": "age1new"}]},
+        }
+        assert S_IMODE(path.stat().st_mode) == 0o640
+        assert list(tmp_path.glob(".*.tmp")) == []
+
+    @mark.usefixtures("fake_sops")
+    def test_error(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        text = dumps({"fail": True, "sops": {}})
+        _ = path.write_text(text)
+        with raises(CalledProcessError, match=r"returned non-zero exit status 1"):
+            _pipe(path, env={}, target=_single("age1new"))
+        assert path.read_text() == text
+        assert list(tmp_path.glob(".*.tmp")) == []
+
+
+class TestReadTarget:
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text(
+            dumps({
+                "key": "ENC[...]",
+                "sops": {
+                    "age": [{"recipient": "age1a"}, {"recipient": "age1b"}],
+                    "pgp": None,
+                    "kms": [],
+                },
+            })
+        )
+        result = _read_target(path)
+        assert result is not None
+        assert result.key == _single("age1b", "age1a").key
+
+    def test_key_groups(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text(
+            dumps({
+                "sops": {
+                    "key_groups": [
+                        {"age": [{"recipient": "age1a"}, {"recipient": "age1b"}]},
+                        {"age": [{"recipient": "age1c"}]},
+                    ],
+                    "shamir_threshold": 2,
+                }
+            })
+        )
+        result = _read_target(path)
+        assert result is not None
+        expected = _Target(groups=(frozenset({"age1c"}), frozenset({"age1a", "age1b"})))
+        assert result.key == expected.key
+
+    @mark.parametrize(
+        "text",
+        [
+            param(dumps({"sops": {"age": [{"recipient": "age1a"}], "pgp": [{}]}})),
+            param(dumps({"sops": {"key_groups": [{"age": [], "kms": [{}]}]}})),
+            param(dumps({"sops": {"age": [{}]}})),
+            param(dumps({"sops": []})),
+            param(dumps({"key": "value"})),
+            param("invalid"),
+        ],
+    )
+    def test_none(self, *, text: str, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text(text)
+        assert _read_target(path) is None
+
+
+class TestTarget:
+    def test_key(self) -> None:
+        first = _Target(groups=(frozenset({"a", "b"}), frozenset({"c"})))
+        second = _Target(groups=(frozenset({"c"}), frozenset({"b", "a"})), threshold=2)
+        assert first.key == second.key
+
+    def test_key_threshold(self) -> None:
+        first = _Target(groups=(frozenset({"a"}), frozenset({"b"})), threshold=1)
+        second = _Target(groups=(frozenset({"a"}), frozenset({"b"})), threshold=2)
+        assert first.key != second.key
+
+    def test_encrypt_cmd(self) -> None:
+        result = _single("age1b", "age1a").get_encrypt_cmd()
+        assert result == ["sops", "encrypt", "--age", "age1a,age1b"]
+
+    def test_config(self) -> None:
+        target = _Target(groups=(frozenset({"a", "b"}), frozenset({"c"})), threshold=1)
+        assert loads(target.to_config()) == {
+            "creation_rules": [
+                {
+                    "key_groups": [{"age": ["a", "b"]}, {"age": ["c"]}],
+                    "shamir_threshold": 1,
+                }
+            ]
+        }
+
+
+class TestGetTarget:
+    def test_new_key(self) -> None:
+        result = _get_target({"SOPS_AGE_KEY": _IDENTITY})
+        assert result.key == _single(_RECIPIENT).key
+
+    def test_recipients(self) -> None:
+        result = _get_target({"SOPS_AGE_KEY": _IDENTITY}, recipients=["age1a"])
+        assert result.key == _single("age1a", _RECIPIENT).key
+
+    def test_drop_key(self) -> None:
+        result = _get_target(
+            {"SOPS_AGE_KEY": _IDENTITY}, recipients=["age1a"], drop_key=True
+        )
+        assert result.key == _single("age1a").key
+
+    def test_key_groups(self) -> None:
+        result = _get_target(
+            {}, key_groups=[["age1a", "age1b"], ["age1c"]], shamir_threshold=1
+        )
+        expected = _Target(
+            groups=(frozenset({"age1a", "age1b"}), frozenset({"age1c"})), threshold=1
+        )
+        assert result == expected
+
+    def test_error_exclusive(self) -> None:
+        with raises(ValueError, match=r"mutually exclusive"):
+            _ = _get_target({}, recipients=["age1a"], key_groups=[["age1b"]])
+
+    def test_error_drop_key(self) -> None:
+        with raises(ValueError, match=r"'drop_key' requires 'recipients'"):
+            _ = _get_target({"SOPS_AGE_KEY": _IDENTITY}, drop_key=True)
+
+    def test_error_empty_group(self) -> None:
+        with raises(ValueError, match=r"Key groups must be non-empty"):
+            _ = _get_target({}, key_groups=[["age1a"], []])
+
+
+@mark.usefixtures("fake_sops")
+class TestReEncryptOne:
+    def test_main(self, *, tmp_path: Path) -> None:
+        path = self._write(tmp_path, recipient="age1old")
+        target = _single("age1new")
+        result = _re_encrypt_one(path, env={}, target=target)
+        assert result.stale
+        assert result.re_encrypted
+        assert _read_target(path) == target
+
+    def test_up_to_date(self, *, tmp_path: Path) -> None:
+        path = self._write(tmp_path, recipient="age1new")
+        mtime = path.stat().st_mtime_ns
+        result = _re_encrypt_one(path, env={}, target=_single("age1new"))
+        assert not result.stale
+        assert not result.re_encrypted
+        assert path.stat().st_mtime_ns == mtime
+
+    def test_force(self, *, tmp_path: Path) -> None:
+        path = self._write(tmp_path, recipient="age1new")
+        result = _re_encrypt_one(path, env={}, target=_single("age1new"), force=True)
+        assert result.re_encrypted
+
+    def test_audit(self, *, tmp_path: Path) -> None:
+        path = self._write(tmp_path, recipient="age1old")
+        text = path.read_text()
+        result = _re_encrypt_one(path, env={}, target=_single("age1new"), audit=True)
+        assert result.stale
+        assert not result.re_encrypted
+        assert path.read_text() == text
+
+    def test_missing(self, *, tmp_path: Path) -> None:
+        result = _re_encrypt_one(
+            tmp_path / "missing.json", env={}, target=_single("age1new")
+        )
+        assert result.error is not None
+
+    def test_resume(self, *, tmp_path: Path) -> None:
+        path = self._write(tmp_path, recipient="age1new")
+        target = _single("age1new")
+        manifest = _Manifest.open(target.key)
+        first = _re_encrypt_one(
+            path, env={}, target=target, force=True, manifest=manifest
+        )
+        assert first.re_encrypted
+        second = _re_encrypt_one(
+            path, env={}, target=target, force=True, manifest=manifest
+        )
+        assert not second.stale
+        assert not second.re_encrypted
+
+    def test_multiple_recipients(self, *, tmp_path: Path) -> None:
+        path = self._write(tmp_path, recipient="age1a")
+        target = _single("age1a", "age1b")
+        result = _re_encrypt_one(path, env={}, target=target)
+        assert result.re_encrypted
+        assert _read_target(path) == target
+        again = _re_encrypt_one(path, env={}, target=_single("age1b", "age1a"))
+        assert not again.stale
+
+    def test_key_groups(self, *, tmp_path: Path) -> None:
+        path = self._write(tmp_path, recipient="age1a")
+        target = _Target(
+            groups=(frozenset({"age1a"}), frozenset({"age1b", "age1c"})), threshold=1
+        )
+        target.config = tmp_path / ".sops.yaml"
+        _ = target.config.write_text(target.to_config())
+        result = _re_encrypt_one(path, env={}, target=target)
+        assert result.re_encrypted
+        current = _read_target(path)
+        assert current is not None
+        assert current.key == target.key
+        again = _re_encrypt_one(path, env={}, target=target)
+        assert not again.stale
+
+    def _write(self, tmp_path: Path, /, *, recipient: str) -> Path:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text(
+            dumps({"key": "value", "sops": {"age": [{"recipient": recipient}]}})
+        )
+        return path
+
+
+@mark.usefixtures("fake_sops")
+class TestReEncryptResume:
+    def test_force_after_success(self, *, tmp_path: Path) -> None:
+        path = tmp_path / "secrets.json"
+        _ = path.write_text(
+            dumps({"key": "value", "sops": {"age": [{"recipient": _RECIPIENT}]}})
+        )
+        for _ in range(2):
+            (result,) = re_encrypt(path, key=_IDENTITY, force=True)
+            assert result.re_encrypted
+        assert not _Manifest.open(_single(_RECIPIENT).key).path.exists()
+
+    def test_resume_after_failure(self, *, tmp_path: Path) -> None:
+        good, bad = tmp_path / "good.json", tmp_path / "bad.json"
+        _ = good.write_text(dumps({"key": "value", "sops": {"age": []}}))
+        _ = bad.write_text(dumps({"fail": "value", "sops": {"age": []}}))
+        with raises(RuntimeError, match=r"Failed to re-encrypt 1 file\(s\)"):
+            _ = re_encrypt(good, bad, key=_IDENTITY)
+        manifest = _Manifest.open(_single(_RECIPIENT).key)
+        assert manifest.is_completed(good, _hash(good))
+        _ = bad.write_text(dumps({"key": "value", "sops": {"age": []}}))
+        results = re_encrypt(good, bad, key=_IDENTITY, force=True)
+        assert [r.re_encrypted for r in results] == [False, True]
+        assert not manifest.path.exists()
+
+
+@_SKIP_NO_SOPS
+class TestReEncrypt:
+    def test_main(
+        self, *, keys: tuple[Path, Path], monkeypatch: MonkeyPatch, tmp_path: Path
+    ) -> None:
+        old, new = keys
+        paths = [tmp_path / f"secrets{i}.json" for i in range(3)]
+        for i, path in enumerate(paths):
+            _encrypt(path, {"key": f"value{i}"}, key_file=old)
+        results = re_encrypt(
+            tmp_path / "secrets*.json", key_file=old, new_key_file=new, max_workers=2
+        )
+        assert [r.path for r in results] == paths
+        assert all(r.error is None for r in results)
+        for i, path in enumerate(paths):
+            decrypted = _decrypt(path, key_file=new, monkeypatch=monkeypatch)
+            assert loads(decrypted) == {"key": f"value{i}"}
+
+    def test_recipients(
+        self, *, keys: tuple[Path, Path], monkeypatch: MonkeyPatch, tmp_path: Path
+    ) -> None:
+        old, new = keys
+        path = tmp_path / "secrets.json"
+        _encrypt(path, {"key": "value"}, key_file=old)
+        recipient = run("age-keygen", "-y", str(old), return_=True)
+        _ = re_encrypt(path, key_file=old, new_key_file=new, recipients=[recipient])
+        for key_file in [old, new]:
+            decrypted = _decrypt(path, key_file=key_file, monkeypatch=monkeypatch)
+            assert loads(decrypted) == {"key": "value"}
+
+    def test_error(self, *, keys: tuple[Path, Path], tmp_path: Path) -> None:
+        old, _ = keys
+        path = tmp_path / "secrets.json"
+        _ = path.write_text("{}")
+        with raises(RuntimeError, match=r"Failed to re-encrypt 1 file\(s\)"):
+            _ = re_encrypt(path, key_file=old)
+
+
+def _single(*recipients: str) -> _Target:
+    return _Target(groups=(frozenset(recipients),))
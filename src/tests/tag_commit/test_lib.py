@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from pytest import fixture, mark
+from utilities.subprocess import run
+from utilities.version import Version3
+
+from actions.tag_commit.lib import (
+    _get_tags,
+    _get_version,
+    _parse_ls_remote,
+    _push_tags,
+    _read_version,
+)
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from pytest import MonkeyPatch
+
+
+class TestGetTags:
+    def test_main(self) -> None:
+        result = _get_tags(Version3.parse("1.2.3"))
+        assert result == ["1.2.3"]
+
+    def test_all(self) -> None:
+        result = _get_tags(
+            Version3.parse("1.2.3"), major_minor=True, major=True, latest=True
+        )
+        assert result == ["1.2.3", "1.2", "1", "latest"]
+
+
+class TestReadVersion:
+    def test_bumpversion_toml(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / ".bumpversion.toml").write_text(
+            '[tool.bumpversion]\ncurrent_version = "1.2.3"\n'
+        )
+        assert _read_version(root=tmp_path) == "1.2.3"
+
+    def test_pyproject_toml(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / "pyproject.toml").write_text(
+            '[project]\nname = "name"\n\n[tool.bumpversion]\ncurrent_version = "1.2.3"\n'
+        )
+        assert _read_version(root=tmp_path) == "1.2.3"
+
+    def test_precedence(self, *, tmp_path: Path) -> None:
+        for name, version in [
+            (".bumpversion.toml", "1.2.3"),
+            ("pyproject.toml", "4.5.6"),
+        ]:
+            _ = (tmp_path / name).write_text(
+                f'[tool.bumpversion]\ncurrent_version = "{version}"\n'
+            )
+        assert _read_version(root=tmp_path) == "1.2.3"
+
+    def test_missing(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / "pyproject.toml").write_text('[project]\nname = "name"\n')
+        assert _read_version(root=tmp_path) is None
+
+    def test_invalid(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / ".bumpversion.toml").write_text("invalid")
+        assert _read_version(root=tmp_path) is None
+
+
+class TestGetVersion:
+    def test_main(self, *, tmp_path: Path) -> None:
+        _ = (tmp_path / ".bumpversion.toml").write_text(
+            '[tool.bumpversion]\ncurrent_version = "1.2.3"\n'
+        )
+        assert _get_version(root=tmp_path) == Version3.parse("1.2.3")
+
+
+class TestParseLsRemote:
+    def test_main(self) -> None:
+        text = (
+            "aaa\trefs/tags/1.2.3\nbbb\trefs/tags/1.2.3^{}\nccc\trefs/tags/lightweight"
+        )
+        result = _parse_ls_remote(text)
+        assert result == {"1.2.3": "bbb", "lightweight": "ccc"}
+
+    def test_empty(self) -> None:
+        assert _parse_ls_remote("") == {}
+
+
+class TestPushTags:
+    @fixture
+    def remote(self, *, monkeypatch: MonkeyPatch, tmp_path: Path) -> Path:
+        remote, local = tmp_path / "remote", tmp_path / "local"
+        _ = run("git", "init", "--bare", str(remote), return_=True)
+        _ = run("git", "init", str(local), return_=True)
+        monkeypatch.chdir(local)
+        for cmd in [
+            ["config", "user.name", "name"],
+            ["config", "user.email", "email"],
+            ["remote", "add", "origin", str(remote)],
+        ]:
+            _ = run("git", *cmd, return_=True)
+        return remote
+
+    def test_main(self, *, remote: Path) -> None:
+        for i in range(2):
+            _ = run("git", "commit", "--allow-empty", "-m", f"commit {i}", return_=True)
+            _ = _push_tags(f"1.{i}.0", "1", "latest")
+        head = run("git", "rev-parse", "HEAD", return_=True)
+        refs = run("git", "ls-remote", "--tags", str(remote), return_=True)
+        tags = {
+            ref.removeprefix("refs/tags/").removesuffix("^{}")
+            for line in refs.splitlines()
+            for _, ref in [line.split()]
+            if line.startswith(head)
+        }
+        assert tags == {"1.1.0", "1", "latest"}
+
+    def test_skips_unchanged(self, *, remote: Path) -> None:
+        _ = run("git", "commit", "--allow-empty", "-m", "commit", return_=True)
+        first = _push_tags("1.0.0", "latest")
+        assert first == ["1.0.0", "latest"]
+        before = run("git", "ls-remote", "--tags", str(remote), return_=True)
+        second = _push_tags("1.0.0", "latest")
+        assert second == []
+        after = run("git", "ls-remote", "--tags", str(remote), return_=True)
+        assert after == before
+
+    @mark.usefixtures("remote")
+    def test_moves_changed(self) -> None:
+        _ = run("git", "commit", "--allow-empty", "-m", "commit 0", return_=True)
+        _ = _push_tags("1.0.0", "latest")
+        _ = run("git", "commit", "--allow-empty", "-m", "commit 1", return_=True)
+        result = _push_tags("1.1.0", "latest")
+        assert result == ["1.1.0", "latest"]
@@ -59,6 +59,24 @@ class TestCLI:
         result = runner.invoke(command, args)
         assert result.exit_code == 0, result.stderr
 
+    @mark.parametrize(
+        ("command", "args"),
+        [
+            param(actions.clean_dir.cli.cli, ["--watch", "--dry-run"]),
+            param(actions.cli.cli, [CLEAN_DIR_SUB_CMD, "--watch", "--dry-run"]),
+            param(actions.random_sleep.cli.cli, ["--slots", "2"]),
+            param(actions.cli.cli, [RANDOM_SLEEP_SUB_CMD, "--slots", "2"]),
+            param(
+                actions.publish_package.cli.cli,
+                ["--targets", __file__, "--username", "username"],
+            ),
+        ],
+    )
+    def test_usage_errors(self, *, command: Command, args: list[str]) -> None:
+        runner = CliRunner()
+        result = runner.invoke(command, args)
+        assert result.exit_code == 2, result.stderr
+
     @mark.parametrize(
         ("command", "args"),
         [